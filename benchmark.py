@@ -0,0 +1,310 @@
+import argparse
+import json
+import math
+import os
+import platform
+import statistics
+import sys
+import time
+
+# Benchmarks run without a window; set before pygame is first imported
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import numpy as np
+import pygame
+from pygame.locals import K_LEFT, K_RIGHT, K_SPACE
+
+import doom
+import space_invaders
+from game_map import GameMap
+from level import CELL_SIZE, Level, default_level
+from raycaster import SCALAR_TAIL_RAYS, cast_rays
+from simulation import RandomInput, SimulatedClock
+
+MAP_SIZES = (10, 64, 256)
+ENEMY_COUNTS = (3, 100, 1000)
+PATH_POINTS = 32
+SEED = 1
+
+
+def benchmark_level(size, enemy_count, seed=SEED):
+    """Return a square level of the given size for benchmarking.
+
+    The border is solid and the cells inside are walls with a fixed
+    probability, except for a ring one cell in from the border, which the
+    camera path follows. Enemies are spread over the ring. The same
+    arguments always give the same level; the smallest size is the
+    built-in level, to keep its numbers comparable with play.
+    """
+    if size == 10 and enemy_count == 3:
+        return default_level()
+
+    rng = np.random.default_rng(seed)
+    cells = (rng.random((size, size)) < 0.2).astype(np.uint8)
+    cells[[0, -1], :] = 1
+    cells[:, [0, -1]] = 1
+    cells[[1, -2], 1:-1] = 0
+    cells[1:-1, [1, -2]] = 0
+
+    # Off the middle of the ring, so the camera never stands inside an enemy
+    points = camera_path(size, enemy_count)
+    types = list(doom.ENEMY_TYPES)
+    enemy_spawns = [(x, y + CELL_SIZE / 4, types[i % len(types)]) for i, (x, y, angle) in enumerate(points)]
+    return Level(GameMap(cells), (CELL_SIZE * 1.5, CELL_SIZE * 1.5, math.pi / 4), enemy_spawns, [])
+
+
+def camera_path(size, points=PATH_POINTS):
+    """Return fixed (x, y, angle) camera positions around the ring of a benchmark level.
+
+    The camera goes round the ring one cell in from the border, turning a
+    little at each point so that the views cover every direction.
+    """
+    inner = (size - 3) * CELL_SIZE  # side length of the ring, between cell centers
+    path = []
+    for i in range(points):
+        distance = 4 * inner * i / points
+        side, along = divmod(distance, inner)
+        start = CELL_SIZE * 1.5
+        x, y = [(start + along, start), (start + inner, start + along),
+                (start + inner - along, start + inner), (start, start + inner - along)][int(side)]
+        path.append((x, y, (2 * math.pi * i / points * 3) % (2 * math.pi)))
+    return path
+
+
+def measure(function, number, repeat):
+    """Time function over repeat runs of number calls each, after one warm-up run.
+
+    Returns the milliseconds per call of every run. With number a multiple
+    of PATH_POINTS, every run covers the same camera views.
+    """
+    for _ in range(number):
+        function()
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        runs.append((time.perf_counter() - start) / number * 1000)
+    return runs
+
+
+def view_cycle(path, depth_buffers=None):
+    """Return a function that moves Doom's camera to the next point of path on every call.
+
+    If depth_buffers is given, the function also puts back the depth buffer
+    cast from that point, so no rays are cast inside the timed call.
+    """
+    state = {"next": 0}
+
+    def move():
+        point = state["next"] % len(path)
+        doom.player_x, doom.player_y, doom.player_angle = path[point]
+        if depth_buffers is not None:
+            doom.depth_buffer, doom.depth_buffer_view = depth_buffers[point]
+        state["next"] += 1
+    return move
+
+
+def cast_depth_buffers(path):
+    """Cast the view rays from every point of path and return the depth buffers."""
+    depth_buffers = []
+    for point in path:
+        doom.player_x, doom.player_y, doom.player_angle = point
+        doom.cast_view_rays()
+        depth_buffers.append((doom.depth_buffer, doom.depth_buffer_view))
+    return depth_buffers
+
+
+def doom_benchmarks(size, enemy_count):
+    """Yield (name, function) pairs benchmarking Doom's raycaster, renderer and enemy AI on one level."""
+    doom.reset_game(benchmark_level(size, enemy_count))
+    path = camera_path(size)
+    move = view_cycle(path)
+    move_with_depths = view_cycle(path, cast_depth_buffers(path))
+    offsets = doom.ray_angle_offsets
+
+    def scalar_rays():
+        move()
+        for offset in offsets:
+            doom.cast_ray(doom.player_angle + offset)
+
+    def batched_rays():
+        move()
+        cast_rays(doom.MAP.cells, doom.player_x, doom.player_y, doom.player_angle + offsets,
+                  CELL_SIZE, doom.MAX_DEPTH, doom.MAP.occupancy)
+
+    def walls():
+        move()
+        doom.render_walls()
+
+    def enemies():
+        move_with_depths()
+        doom.render_enemies()
+
+    def enemy_ai():
+        move()
+        doom.game_clock.tick()
+        doom.update_game_state()
+
+    suffix = f"map{size}"
+    yield f"doom.cast_ray/{suffix}", scalar_rays
+    yield f"doom.cast_rays/{suffix}", batched_rays
+    yield f"doom.render_walls/{suffix}", walls
+    yield f"doom.render_enemies/{suffix}_enemies{enemy_count}", enemies
+    yield f"doom.update_game_state/{suffix}_enemies{enemy_count}", enemy_ai
+
+
+def space_invaders_benchmarks():
+    """Yield (name, function) pairs benchmarking the Space Invaders update and collisions."""
+    game = space_invaders.SpaceInvadersGame(SimulatedClock())
+    bot = RandomInput((K_LEFT, K_RIGHT), (K_SPACE,), SEED, tap_chance=0.3)
+
+    def update():
+        game.clock.tick(60)
+        events, keys = bot.poll()
+        game.step(events, keys)
+        if game.game_over:
+            game.reset()
+
+    # A full formation with bullets in the gaps between its columns: every
+    # bullet is level with the enemies and tested, but none hits, so the
+    # state is the same for every call
+    target = space_invaders.SpaceInvadersGame(SimulatedClock())
+    formation = target.formation
+    gap = formation.enemy_size + (formation.spacing - formation.enemy_size) // 2
+    for row in range(formation.rows):
+        for col in range(formation.cols - 1):
+            bullet = space_invaders.Bullet(formation.left + col * formation.spacing + gap,
+                                           formation.top + row * formation.spacing + 30)
+            target.bullets.add(bullet)
+
+    yield "space_invaders.update", update
+    yield f"space_invaders.collide_bullets/bullets{len(target.bullets)}", target.collide_bullets
+
+
+def check_raycaster(size=64, densities=(0.01, 0.05, 0.2), points=50):
+    """Return the rays on which cast_rays disagrees with doom.cast_ray.
+
+    The rays are cast along the axes and the diagonals from the centres of
+    a fixed sample of empty cells of random size x size maps, one per wall
+    density. There, x and y crossings tie exactly, and on the sparser maps
+    the rays cross large empty blocks, which is where the batched
+    raycaster's jumps over empty space are most likely to round
+    differently from the scalar DDA. Each direction is cast
+    SCALAR_TAIL_RAYS times in the same call, so that the rays go through
+    the batched loop rather than the scalar tail. Each mismatch is
+    (density, x, y, angle, scalar hit, batched hit).
+    """
+    rng = np.random.default_rng(SEED)
+    directions = np.arange(8) * math.pi / 4
+    angles = np.tile(directions, SCALAR_TAIL_RAYS)
+    mismatches = []
+    for density in densities:
+        cells = (rng.random((size, size)) < density).astype(np.uint8)
+        cells[[0, -1], :] = 1
+        cells[:, [0, -1]] = 1
+        doom.reset_game(Level(GameMap(cells), (CELL_SIZE * 1.5, CELL_SIZE * 1.5, 0), [], []))
+        empty_y, empty_x = np.nonzero(cells == 0)
+        for cell in rng.permutation(len(empty_x))[:points].tolist():
+            doom.player_x = (int(empty_x[cell]) + 0.5) * CELL_SIZE
+            doom.player_y = (int(empty_y[cell]) + 0.5) * CELL_SIZE
+            distances, tex_xs, sides = cast_rays(doom.MAP.cells, doom.player_x, doom.player_y, angles,
+                                                 CELL_SIZE, doom.MAX_DEPTH, doom.MAP.occupancy)
+            # Every copy of a direction must match the scalar hit for it
+            scalar_hits = [doom.cast_ray(angle) for angle in directions.tolist()]
+            hits = zip(distances.tolist(), tex_xs.tolist(), sides.tolist())
+            for ray, (angle, batched) in enumerate(zip(angles.tolist(), hits)):
+                scalar = scalar_hits[ray % len(directions)]
+                # Texture coordinates of 0 and CELL_SIZE are the same column edge
+                same_tex = math.isclose(scalar[1] % CELL_SIZE, batched[1] % CELL_SIZE, abs_tol=1e-9)
+                if scalar[0] != batched[0] or scalar[2] != batched[2] or not same_tex:
+                    mismatches.append((density, doom.player_x, doom.player_y, angle, scalar, batched))
+    return mismatches
+
+
+def run_benchmarks(name_filter=None, number=PATH_POINTS, repeat=7):
+    """Run every benchmark whose name contains name_filter and return their results."""
+    suites = [doom_benchmarks(size, count) for size, count in zip(MAP_SIZES, ENEMY_COUNTS)]
+    suites.append(space_invaders_benchmarks())
+
+    results = {}
+    for suite in suites:
+        for name, function in suite:
+            if name_filter and name_filter not in name:
+                continue
+            runs = measure(function, number, repeat)
+            results[name] = {
+                "median_ms": statistics.median(runs),
+                "min_ms": min(runs),
+                "calls": number * repeat,
+            }
+            print(f"{name:50s} {results[name]['min_ms']:9.3f} ms", file=sys.stderr)
+    return {
+        "python": platform.python_version(),
+        "pygame": pygame.version.ver,
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "results": results,
+    }
+
+
+def compare(results, baseline, threshold):
+    """Return the benchmarks more than threshold slower than in baseline.
+
+    The fastest run of each benchmark is compared, since noise from the rest
+    of the machine only ever slows a run down. Each regression is (name,
+    baseline ms, current ms).
+    """
+    regressions = []
+    for name, result in results["results"].items():
+        before = baseline["results"].get(name)
+        if before is None:
+            continue
+        ratio = result["min_ms"] / before["min_ms"]
+        print(f"{name:50s} {before['min_ms']:9.3f} -> {result['min_ms']:9.3f} ms ({ratio - 1:+.1%})",
+              file=sys.stderr)
+        if ratio > 1 + threshold:
+            regressions.append((name, before["min_ms"], result["min_ms"]))
+    return regressions
+
+
+def main():
+    """Run the benchmarks from the command line."""
+    parser = argparse.ArgumentParser(description='Benchmark the raycaster, renderer and game updates')
+    parser.add_argument('--output', metavar='PATH', help='write the results to PATH as JSON')
+    parser.add_argument('--compare', metavar='PATH',
+                        help='compare against the results in PATH and exit with status 1 on a regression')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='slowdown of the fastest run that counts as a regression (default: 0.1, i.e. 10%%)')
+    parser.add_argument('--filter', metavar='TEXT', help='only run benchmarks whose name contains TEXT')
+    parser.add_argument('--number', type=int, default=PATH_POINTS,
+                        help=f'calls per timed run (default: {PATH_POINTS}, once round the camera path)')
+    parser.add_argument('--repeat', type=int, default=7, help='timed runs per benchmark (default: 7)')
+    args = parser.parse_args()
+
+    # Timings of a raycaster that gives different hits would mean nothing
+    for density, x, y, angle, scalar, batched in check_raycaster():
+        print(f"cast_rays mismatch at wall density {density} from ({x}, {y}) at {angle:.4f}: "
+              f"{batched} instead of {scalar}", file=sys.stderr)
+        sys.exit(1)
+
+    results = run_benchmarks(args.filter, args.number, args.repeat)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for name, before, after in regressions:
+            print(f"regression: {name} {before:.3f} -> {after:.3f} ms", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,28 @@
 import pygame
+import argparse
+import json
 import math
 import sys
+from contextlib import contextmanager
+import numpy as np
 from pygame.locals import *
 
+from enemy_store import ENEMY_TYPES, Enemy, EnemyStore
+from frame_profiler import FrameProfiler
+from level import default_level, load_level
+from minimap import Minimap
+from raycaster import cast_rays, column_angle_offsets
+from render_scale import RenderScaler
+from simulation import RealClock, ScriptedInput, SimulatedClock
+from spatial_index import SpatialHash
+from sprite_registry import SpriteRegistry
+from text_cache import TextCache
+from texture_atlas import TextureAtlas
+from wall_renderer import WallRenderer
+
 # Initialize pygame2
 pygame.init()
 pygame.font.init()
-pygame.mixer.init()  # Initialize sound mixer
 
 # Constants
 SCREEN_WIDTH = 800
@@ -17,8 +33,38 @@ NUM_RAYS = SCREEN_WIDTH // 2  # Number of rays to cast
 MAX_DEPTH = 20  # Maximum ray distance
 CELL_SIZE = 64  # Size of each cell in the map
 PLAYER_SIZE = 10  # Size of player for collision detection
-PLAYER_SPEED = 5  # Movement speed
-ROTATION_SPEED = 0.1  # Rotation speed
+PLAYER_SPEED = 5  # Movement speed per simulation tick
+ROTATION_SPEED = 0.1  # Rotation speed per simulation tick
+TICK_RATE = 60  # Simulation ticks per second, whatever the frame rate
+MAX_FPS = 120  # Cap on rendered frames per second (0 for none)
+MAX_TICKS_PER_FRAME = 5  # Ticks to catch up after a slow frame; time beyond that is dropped
+
+def parse_args(argv=None):
+    """Parse the command-line options, from sys.argv unless argv is given."""
+    parser = argparse.ArgumentParser(description='Doom Python')
+    parser.add_argument('--rays', type=int, default=NUM_RAYS,
+                        help='number of rays cast per frame, i.e. the width of the 3D view '
+                             f'before it is scaled up to the window (default: {NUM_RAYS})')
+    parser.add_argument('--level', metavar='PATH',
+                        help='level file to play instead of the built-in level (F5 reloads it)')
+    parser.add_argument('--dynamic-resolution', action='store_true',
+                        help='lower the ray count automatically when frames go over budget')
+    parser.add_argument('--headless', action='store_true',
+                        help='play one match without a window on a simulated clock and print the outcome')
+    parser.add_argument('--frames', type=int, default=3600,
+                        help='maximum number of frames of a headless match (default: 3600)')
+    parser.add_argument('--script', metavar='PATH',
+                        help='JSON input script to replay in a headless match')
+    parser.add_argument('--render', action='store_true',
+                        help='render every frame of a headless match off-screen')
+    parser.add_argument('--profile', metavar='PATH',
+                        help='write frame time percentiles per stage to PATH as JSON on exit')
+    return parser.parse_args(argv)
+
+# The command line only applies when doom.py is run as a script; imported,
+# e.g. by a match runner, the game starts headless with the default options
+args = parse_args(None if __name__ == '__main__' else [])
+HEADLESS = args.headless or __name__ != '__main__'
 
 # Colors
 BLACK = (0, 0, 0)
@@ -30,34 +76,30 @@ YELLOW = (255, 255, 0)
 GRAY = (100, 100, 100)
 DARK_GRAY = (50, 50, 50)
 
-# Create the screen
-screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-pygame.display.set_caption('Doom Python')
-
-# Clock for controlling game speed
-clock = pygame.time.Clock()
-
-# Simple map (1 represents walls, 0 represents empty space)
-MAP = [
-    [1, 1, 1, 1, 1, 1, 1, 1, 1, 1],
-    [1, 0, 0, 0, 0, 0, 0, 0, 0, 1],
-    [1, 0, 0, 0, 0, 0, 0, 0, 0, 1],
-    [1, 0, 0, 1, 1, 0, 1, 0, 0, 1],
-    [1, 0, 0, 1, 0, 0, 1, 0, 0, 1],
-    [1, 0, 0, 1, 0, 0, 1, 0, 0, 1],
-    [1, 0, 0, 1, 0, 1, 1, 0, 0, 1],
-    [1, 0, 0, 0, 0, 0, 0, 0, 0, 1],
-    [1, 0, 0, 0, 0, 0, 0, 0, 0, 1],
-    [1, 1, 1, 1, 1, 1, 1, 1, 1, 1]
-]
+# Create the screen; headless, frames are rendered off-screen
+if HEADLESS:
+    screen = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+else:
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    pygame.display.set_caption('Doom Python')
 
-MAP_WIDTH = len(MAP[0])
-MAP_HEIGHT = len(MAP)
+# Clock pacing the rendered frames of a windowed game
+clock = RealClock()
+
+# Game time, which only advances by whole simulation ticks, so weapon,
+# reload and enemy attack timings do not depend on the frame rate
+game_clock = SimulatedClock(1000 / TICK_RATE)
+
+# Current level: the map (1 represents walls, 0 represents empty space),
+# the player start and the enemy and power-up spawns
+level = load_level(args.level) if args.level else default_level()
+MAP = level.game_map
+
+MAP_WIDTH = MAP.width
+MAP_HEIGHT = MAP.height
 
 # Player position and direction
-player_x = CELL_SIZE * 1.5
-player_y = CELL_SIZE * 1.5
-player_angle = math.pi / 4  # Initial angle (45 degrees)
+player_x, player_y, player_angle = level.player_start
 
 # Textures (simple color patterns for walls)
 TEXTURES = [
@@ -72,8 +114,32 @@ for y in range(0, CELL_SIZE, 8):
         offset = 8 if y % 16 == 0 else 0
         pygame.draw.rect(TEXTURES[1], GRAY, (x + offset, y, 8, 8))
 
+# Pre-shaded texture columns and their scaled copies
+texture_atlas = TextureAtlas(TEXTURES)
+
+# Low-resolution surface the 3D view is rendered into, one column per ray
+render_scaler = RenderScaler(SCREEN_WIDTH, SCREEN_HEIGHT, args.rays, dynamic=args.dynamic_resolution)
+
+def resize_view():
+    """Rebuild the per-ray angles and wall frame buffer for the current view size."""
+    global ray_angle_offsets, wall_renderer
+    
+    # Angle of each ray relative to the player's view direction
+    ray_angle_offsets = column_angle_offsets(render_scaler.width, HALF_FOV)
+    
+    # Frame-buffer renderer for the walls, ceiling (dark blue) and floor (dark gray)
+    wall_renderer = WallRenderer(render_scaler.width, render_scaler.height, texture_atlas,
+                                 (0, 0, 50), (50, 50, 50))
+
+resize_view()
+
 # Sound effects
 try:
+    if HEADLESS:
+        # Headless machines may have no audio device, and nobody is listening
+        raise pygame.error("no sound when headless")
+    pygame.mixer.init()  # Initialize sound mixer
+    
     # Load sound effects (using simple beeps for now)
     shoot_sound = pygame.mixer.Sound(buffer=bytes([128] * 1000))
     shoot_sound.set_volume(0.2)
@@ -183,110 +249,77 @@ weapon_state = {
     "last_fire_time": 0
 }
 
-# Enemy class
-class Enemy:
-    def __init__(self, x, y, enemy_type="imp"):
-        self.x = x
-        self.y = y
-        self.enemy_type = enemy_type
-        self.size = CELL_SIZE // 2
-        
-        # Enemy type-specific attributes
-        if enemy_type == "imp":
-            self.health = 100
-            self.speed = 2
-            self.attack_range = 200
-            self.damage = 10
-            self.attack_rate = 1000  # milliseconds
-            self.color = RED
-        elif enemy_type == "cacodemon":
-            self.health = 150
-            self.speed = 3
-            self.attack_range = 300
-            self.damage = 15
-            self.attack_rate = 800
-            self.color = (255, 0, 255)  # Purple
-        elif enemy_type == "baron":
-            self.health = 300
-            self.speed = 1.5
-            self.attack_range = 400
-            self.damage = 25
-            self.attack_rate = 1500
-            self.color = (139, 0, 0)  # Dark red
-        
-        self.is_alive = True
-        self.last_attack_time = 0
-        self.texture = pygame.Surface((self.size, self.size))
-        self.texture.fill(self.color)
-        
-        # Add enemy-specific details
-        if enemy_type == "imp":
-            # Horned imp
-            pygame.draw.circle(self.texture, BLACK, (self.size // 3, self.size // 3), self.size // 10)
-            pygame.draw.circle(self.texture, BLACK, (2 * self.size // 3, self.size // 3), self.size // 10)
-            pygame.draw.polygon(self.texture, BLACK, [
-                (self.size // 4, self.size // 4),
-                (self.size // 2, 0),
-                (3 * self.size // 4, self.size // 4)
-            ])
-        elif enemy_type == "cacodemon":
-            # Floating eye
-            pygame.draw.circle(self.texture, WHITE, (self.size // 2, self.size // 2), self.size // 3)
-            pygame.draw.circle(self.texture, BLACK, (self.size // 2, self.size // 2), self.size // 4)
-            pygame.draw.circle(self.texture, WHITE, (self.size // 2, self.size // 2), self.size // 8)
-        elif enemy_type == "baron":
-            # Horned demon
-            pygame.draw.circle(self.texture, BLACK, (self.size // 3, self.size // 3), self.size // 8)
-            pygame.draw.circle(self.texture, BLACK, (2 * self.size // 3, self.size // 3), self.size // 8)
-            pygame.draw.polygon(self.texture, BLACK, [
-                (self.size // 4, self.size // 4),
-                (self.size // 2, 0),
-                (3 * self.size // 4, self.size // 4)
-            ])
-            pygame.draw.polygon(self.texture, BLACK, [
-                (self.size // 4, self.size // 4),
-                (self.size // 2, self.size),
-                (3 * self.size // 4, self.size // 4)
-            ])
-
-    def update(self, player_x, player_y, current_time):
-        if not self.is_alive:
-            return False
+# Enemy colors by type
+ENEMY_COLORS = {
+    "imp": RED,
+    "cacodemon": (255, 0, 255),  # Purple
+    "baron": (139, 0, 0)  # Dark red
+}
+
+def create_enemy_texture(enemy_type, size):
+    """Draw the texture shared by every enemy of the given type."""
+    texture = pygame.Surface((size, size))
+    texture.fill(ENEMY_COLORS[enemy_type])
+    
+    # Add enemy-specific details
+    if enemy_type == "imp":
+        # Horned imp
+        pygame.draw.circle(texture, BLACK, (size // 3, size // 3), size // 10)
+        pygame.draw.circle(texture, BLACK, (2 * size // 3, size // 3), size // 10)
+        pygame.draw.polygon(texture, BLACK, [
+            (size // 4, size // 4),
+            (size // 2, 0),
+            (3 * size // 4, size // 4)
+        ])
+    elif enemy_type == "cacodemon":
+        # Floating eye
+        pygame.draw.circle(texture, WHITE, (size // 2, size // 2), size // 3)
+        pygame.draw.circle(texture, BLACK, (size // 2, size // 2), size // 4)
+        pygame.draw.circle(texture, WHITE, (size // 2, size // 2), size // 8)
+    elif enemy_type == "baron":
+        # Horned demon
+        pygame.draw.circle(texture, BLACK, (size // 3, size // 3), size // 8)
+        pygame.draw.circle(texture, BLACK, (2 * size // 3, size // 3), size // 8)
+        pygame.draw.polygon(texture, BLACK, [
+            (size // 4, size // 4),
+            (size // 2, 0),
+            (3 * size // 4, size // 4)
+        ])
+        pygame.draw.polygon(texture, BLACK, [
+            (size // 4, size // 4),
+            (size // 2, size),
+            (3 * size // 4, size // 4)
+        ])
+    
+    return texture
 
-        # Calculate distance to player
-        dx = player_x - self.x
-        dy = player_y - self.y
-        distance = math.sqrt(dx * dx + dy * dy)
-
-        # Move towards player if within attack range
-        if distance < self.attack_range:
-            # Normalize direction vector
-            if distance > 0:
-                dx = dx / distance * self.speed
-                dy = dy / distance * self.speed
-                self.x += dx
-                self.y += dy
-
-            # Attack if within range and cooldown is ready
-            if distance < self.size * 2 and current_time - self.last_attack_time >= self.attack_rate:
-                self.last_attack_time = current_time
-                return True  # Signal that the enemy is attacking
+ENEMY_SIZE = CELL_SIZE // 2
 
-        return False
+# Shared sprite textures for every enemy and power-up type, with their mip levels
+sprite_registry = SpriteRegistry(SCREEN_HEIGHT)
+for enemy_type in ENEMY_TYPES:
+    sprite_registry.register(("enemy", enemy_type), create_enemy_texture(enemy_type, ENEMY_SIZE))
 
-    def take_damage(self, damage):
-        self.health -= damage
-        if self.health <= 0:
-            self.is_alive = False
-            return True  # Enemy died
-        return False
+def spawn_enemies(level):
+    """Create the enemies listed in a level's spawn table.
+    
+    Returns the EnemyStore holding their state and a list of handles on it.
+    """
+    store = EnemyStore(len(level.enemy_spawns))
+    handles = [Enemy(store, store.spawn(x, y, enemy_type, ENEMY_SIZE))
+               for x, y, enemy_type in level.enemy_spawns]
+    return store, handles
 
-# Create enemies with different types
-enemies = [
-    Enemy(CELL_SIZE * 3.5, CELL_SIZE * 3.5, "imp"),
-    Enemy(CELL_SIZE * 5.5, CELL_SIZE * 5.5, "cacodemon"),
-    Enemy(CELL_SIZE * 7.5, CELL_SIZE * 2.5, "baron")
-]
+def index_entities(entities):
+    """Return a SpatialHash holding the given entities at their positions."""
+    index = SpatialHash(CELL_SIZE)
+    for entity in entities:
+        index.insert(entity, entity.x, entity.y)
+    return index
+
+# Create enemies with different types, and an index of the living ones
+enemy_store, enemies = spawn_enemies(level)
+enemy_index = index_entities(enemies)
 
 def cast_ray(angle):
     """Cast a ray and return the distance to the wall and the wall texture coordinate."""
@@ -333,7 +366,7 @@ def cast_ray(angle):
             side = 1
         
         # Check if ray has hit a wall
-        if 0 <= map_x < MAP_WIDTH and 0 <= map_y < MAP_HEIGHT and MAP[map_y][map_x] > 0:
+        if MAP.in_bounds(map_x, map_y) and MAP.cell(map_x, map_y) > 0:
             hit = True
     
     # Calculate distance projected on camera direction
@@ -357,119 +390,107 @@ def cast_ray(angle):
     # If no hit, return maximum distance
     return MAX_DEPTH * CELL_SIZE, 0, 0
 
-def render_walls():
-    """Render the walls using raycasting."""
-    # Clear the screen
-    screen.fill(BLACK)
+# Wall distance of every view column from the last cast, and the view it was cast from;
+# used to clip sprites against the walls and for hitscan occlusion
+depth_buffer = None
+depth_buffer_view = None
+
+def cast_view_rays():
+    """Cast one ray per view column and store the wall distances in the depth buffer."""
+    global depth_buffer, depth_buffer_view
     
-    # Draw ceiling (dark blue)
-    pygame.draw.rect(screen, (0, 0, 50), (0, 0, SCREEN_WIDTH, SCREEN_HEIGHT // 2))
+    # Cast all rays for the view in one batch
+    distances, tex_xs, sides = cast_rays(MAP.cells, player_x, player_y,
+                                         player_angle + ray_angle_offsets,
+                                         CELL_SIZE, MAX_DEPTH, MAP.occupancy)
+    depth_buffer = distances
+    depth_buffer_view = (player_x, player_y, player_angle, len(distances), MAP)
+    return distances, tex_xs, sides
+
+def current_depth_buffer():
+    """Return the depth buffer, recasting it if the view has changed since the last cast."""
+    if depth_buffer_view != (player_x, player_y, player_angle, len(ray_angle_offsets), MAP):
+        cast_view_rays()
+    return depth_buffer
+
+def view_column(angle, view_width):
+    """Return the view x-coordinate that a bearing relative to the view direction projects to."""
+    # Inverse of the camera-space mapping used to aim the rays
+    return (np.tan(angle) / math.tan(HALF_FOV) + 1) / 2 * view_width
+
+def blit_sprite(view, sprite, sprite_x, sprite_y, distance):
+    """Draw a sprite into the view, leaving out the columns where a wall is closer."""
+    sprite_width = sprite.get_width()
+    first = max(sprite_x, 0)
+    last = min(sprite_x + sprite_width, len(depth_buffer))
+    if first >= last:
+        return
     
-    # Draw floor (dark gray)
-    pygame.draw.rect(screen, (50, 50, 50), (0, SCREEN_HEIGHT // 2, SCREEN_WIDTH, SCREEN_HEIGHT // 2))
+    # Compare the sprite against the depth of every column it covers
+    visible = depth_buffer[first:last] > distance
+    if visible.all():
+        view.blit(sprite, (sprite_x, sprite_y))
+        return
     
-    # Cast rays
-    for x in range(SCREEN_WIDTH):
-        # Calculate ray position and direction
-        camera_x = 2 * x / SCREEN_WIDTH - 1  # x-coordinate in camera space
-        ray_angle = player_angle + math.atan(camera_x * math.tan(HALF_FOV))
-        
-        # Cast the ray
-        distance, tex_x, side = cast_ray(ray_angle)
-        
-        # Calculate wall height
-        if distance > 0:
-            wall_height = min(int(SCREEN_HEIGHT / distance * CELL_SIZE / 2), SCREEN_HEIGHT)
-        else:
-            wall_height = SCREEN_HEIGHT
-        
-        # Calculate wall top and bottom
-        wall_top = (SCREEN_HEIGHT - wall_height) // 2
-        wall_bottom = wall_top + wall_height
-        
-        # Get the wall texture
-        tex_x = int(tex_x)
-        
-        # Draw the wall slice
-        if side == 1:  # Darker for y-side walls
-            color_intensity = 0.7
-        else:
-            color_intensity = 1.0
-        
-        # Get a column of the texture
-        tex_column = pygame.Surface((1, CELL_SIZE))
-        tex_column.blit(TEXTURES[1], (0, 0), (tex_x, 0, 1, CELL_SIZE))
-        
-        # Scale the texture column to the wall height
-        if wall_height > 0:
-            scaled_column = pygame.transform.scale(tex_column, (1, wall_height))
-            
-            # Apply shading based on distance and side
-            if color_intensity < 1.0:
-                scaled_column.fill((0, 0, 0, int(255 * (1 - color_intensity))), special_flags=pygame.BLEND_RGBA_MULT)
-            
-            # Draw the scaled column
-            screen.blit(scaled_column, (x, wall_top))
+    # Draw each run of visible columns as one slice of the sprite
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], visible.view(np.int8), [0]))))
+    for start, end in zip(edges[::2] + first, edges[1::2] + first):
+        view.blit(sprite, (start, sprite_y), (start - sprite_x, 0, end - start, sprite.get_height()))
+
+def render_walls():
+    """Render the walls using raycasting."""
+    distances, tex_xs, sides = cast_view_rays()
+    
+    # Draw ceiling, floor and textured wall columns into the frame buffer
+    wall_renderer.render(render_scaler.surface, distances, tex_xs, sides, CELL_SIZE, 1)
 
 def render_enemies():
     """Render the enemies using sprite projection."""
-    # Sort enemies by distance (furthest first for correct rendering)
+    view = render_scaler.surface
+    view_width, view_height = view.get_size()
+    
+    # Enemies in the field of view, with their distance and angle relative to the player's view.
+    # The index holds the positions of the last tick, so it only picks the candidates, with a
+    # margin for the movement since; the sprites are placed by the enemies' own positions,
+    # which are interpolated between ticks while rendering
+    max_distance = MAX_DEPTH * CELL_SIZE
     sorted_enemies = []
-    for enemy in enemies:
-        if enemy.is_alive:
-            # Calculate distance to player
-            dx = enemy.x - player_x
-            dy = enemy.y - player_y
-            distance = math.sqrt(dx * dx + dy * dy)
-            
-            # Calculate angle relative to player's view
-            angle = math.atan2(dy, dx) - player_angle
-            
-            # Normalize angle
-            while angle < -math.pi:
-                angle += 2 * math.pi
-            while angle > math.pi:
-                angle += -2 * math.pi
-            
-            # Only render if in field of view
-            if abs(angle) < FOV / 1.5:
-                sorted_enemies.append((distance, enemy, angle))
-    
-    # Sort by distance (furthest first)
-    sorted_enemies.sort(reverse=True)
+    for _, enemy in enemy_index.query_radius(player_x, player_y, max_distance + CELL_SIZE):
+        dx = enemy.x - player_x
+        dy = enemy.y - player_y
+        distance = math.hypot(dx, dy)
+        angle = (math.atan2(dy, dx) - player_angle + math.pi) % (2 * math.pi) - math.pi
+        if 0 < distance < max_distance and abs(angle) < FOV / 1.5:
+            sorted_enemies.append((distance, angle, enemy))
+    
+    # Sort by distance (furthest first for correct rendering)
+    sorted_enemies.sort(key=lambda visible: visible[0], reverse=True)
     
     # Render enemies
-    for distance, enemy, angle in sorted_enemies:
+    for distance, angle, enemy in sorted_enemies:
         # Calculate sprite size based on distance
-        sprite_size = min(int(SCREEN_HEIGHT / distance * enemy.size), SCREEN_HEIGHT)
+        sprite_size = min(int(view_height / distance * enemy.size), view_height)
         if sprite_size <= 0:
             continue
         
-        # Calculate sprite screen position
-        sprite_x = int(SCREEN_WIDTH / 2 + angle / FOV * SCREEN_WIDTH - sprite_size / 2)
-        sprite_y = int((SCREEN_HEIGHT - sprite_size) / 2)
+        # Distance fog darkens far sprites, down to black at half the maximum depth
+        fog_intensity = min(1.0, distance / (MAX_DEPTH * CELL_SIZE / 2))
         
-        # Scale the enemy texture
-        scaled_sprite = pygame.transform.scale(enemy.texture, (sprite_size, sprite_size))
+        # Shared enemy texture at the nearest mip level
+        sprite = sprite_registry.get(("enemy", enemy.enemy_type), sprite_size, 1.0 - fog_intensity)
+        sprite_size = sprite.get_width()
         
-        # Apply distance fog
-        fog_intensity = min(1.0, distance / (MAX_DEPTH * CELL_SIZE / 2))
-        if fog_intensity > 0:
-            fog = pygame.Surface((sprite_size, sprite_size), pygame.SRCALPHA)
-            fog.fill((0, 0, 0, int(255 * fog_intensity)))
-            scaled_sprite.blit(fog, (0, 0), special_flags=pygame.BLEND_RGBA_MULT)
+        # Calculate sprite screen position
+        sprite_x = int(view_column(angle, view_width) - sprite_size / 2)
+        sprite_y = int((view_height - sprite_size) / 2)
         
-        # Draw the sprite
-        screen.blit(scaled_sprite, (sprite_x, sprite_y))
+        # Draw the sprite, clipped against the walls in front of it
+        blit_sprite(view, sprite, sprite_x, sprite_y, distance)
 
 def render_weapon():
     """Render the current weapon."""
-    current_time = pygame.time.get_ticks()
     weapon = weapons[weapon_state["current"]]
     
-    # Update weapon state
-    weapon.update(current_time)
-    
     # Get current weapon frame
     frame = weapon.frames[weapon.current_frame]
     
@@ -484,16 +505,18 @@ def render_weapon():
     
     # Draw ammo count
     ammo_text = f"{weapon.current_ammo}/{weapon.ammo_capacity}"
-    font = pygame.font.SysFont(None, 36)
-    text_surface = font.render(ammo_text, True, WHITE)
+    text_surface = hud_text.render(ammo_text, WHITE)
     screen.blit(text_surface, (SCREEN_WIDTH - 150, SCREEN_HEIGHT - 50))
     
     # Draw reload indicator
     if weapon.is_reloading:
         reload_text = "RELOADING..."
-        text_surface = font.render(reload_text, True, RED)
+        text_surface = hud_text.render(reload_text, RED)
         screen.blit(text_surface, (SCREEN_WIDTH - 150, SCREEN_HEIGHT - 30))
 
+# Fonts and rendered strings for all of the HUD text
+hud_text = TextCache()
+
 def render_hud():
     """Render the heads-up display."""
     # Draw health bar
@@ -518,10 +541,10 @@ def render_hud():
     health_text = f"HP: {player_health}/{max_health}"
     armor_text = f"ARMOR: {player_armor}/{max_armor}"
     
-    text_surface = font.render(health_text, True, WHITE)
+    text_surface = hud_text.render(health_text, WHITE)
     screen.blit(text_surface, (health_x + health_width + 10, health_y))
     
-    text_surface = font.render(armor_text, True, WHITE)
+    text_surface = hud_text.render(armor_text, WHITE)
     screen.blit(text_surface, (health_x + health_width + 10, armor_y))
 
 def check_collision(x, y):
@@ -530,16 +553,15 @@ def check_collision(x, y):
     map_x = int(x / CELL_SIZE)
     map_y = int(y / CELL_SIZE)
     
-    # Check if position is inside a wall
-    if 0 <= map_x < MAP_WIDTH and 0 <= map_y < MAP_HEIGHT:
-        return MAP[map_y][map_x] > 0
-    
-    return True  # Collide with boundaries
+    # Check if position is inside a wall (the map boundaries count as walls)
+    return MAP.is_solid(map_x, map_y)
 
 def fire_weapon():
     """Fire the current weapon."""
+    global kills
+    
     weapon_state["firing"] = True
-    weapon_state["last_fire_time"] = pygame.time.get_ticks()
+    weapon_state["last_fire_time"] = game_clock.get_ticks()
     
     # Play shooting sound
     if shoot_sound:
@@ -548,79 +570,40 @@ def fire_weapon():
         except:
             pass
     
-    # Check for hits on enemies
-    for enemy in enemies:
-        if enemy.is_alive:
-            # Calculate direction to enemy
-            dx = enemy.x - player_x
-            dy = enemy.y - player_y
-            distance = math.sqrt(dx * dx + dy * dy)
-            
-            # Calculate angle to enemy
-            angle_to_enemy = math.atan2(dy, dx)
-            
-            # Normalize angles for comparison
-            player_angle_normalized = player_angle % (2 * math.pi)
-            angle_to_enemy_normalized = angle_to_enemy % (2 * math.pi)
-            
-            # Calculate angle difference
-            angle_diff = abs(player_angle_normalized - angle_to_enemy_normalized)
-            angle_diff = min(angle_diff, 2 * math.pi - angle_diff)
-            
-            # Check if enemy is in front of player and within field of view
-            if angle_diff < FOV / 2 and distance < MAX_DEPTH * CELL_SIZE:
-                # Check if there's a wall between player and enemy
-                hit_wall = False
-                ray_dist, _, _ = cast_ray(angle_to_enemy)
-                
-                if ray_dist >= distance:
-                    # Hit the enemy
-                    enemy.take_damage(25)  # Damage amount
-                    
-                    # Play hit sound
-                    if hit_sound:
-                        try:
-                            hit_sound.play()
-                        except:
-                            pass
-                    
-                    break  # Only hit one enemy per shot
+    # Check for hits on enemies in front of the player
+    targets = enemy_index.query_cone(player_x, player_y, player_angle, FOV / 2, MAX_DEPTH * CELL_SIZE)
+    if not targets:
+        return
+    distances = np.array([target[0] for target in targets])
+    angles = np.array([target[1] for target in targets])
+    
+    # An enemy is hit if no wall is closer in the view column it lies in
+    depths = current_depth_buffer()
+    columns = np.clip(view_column(angles, len(depths)).astype(int), 0, len(depths) - 1)
+    in_sight = np.flatnonzero(depths[columns] >= distances)
+    if in_sight.size == 0:
+        return
+    
+    # Only hit one enemy per shot, the nearest one in sight
+    enemy = targets[in_sight[np.argmin(distances[in_sight])]][2]
+    if enemy.take_damage(25):  # Damage amount
+        enemy_index.remove(enemy)
+        kills += 1
+    
+    # Play hit sound
+    if hit_sound:
+        try:
+            hit_sound.play()
+        except:
+            pass
+
+# Minimap with its walls cached; large maps scroll in a window around the player
+minimap = Minimap(150, background=BLACK, border=WHITE, wall_color=GRAY, player_color=GREEN, enemy_color=RED)
 
 def render_minimap():
     """Render a small minimap in the corner."""
-    map_size = 150
-    cell_size = map_size / max(MAP_WIDTH, MAP_HEIGHT)
-    map_x = SCREEN_WIDTH - map_size - 10
-    map_y = 10
-    
-    # Draw map background
-    pygame.draw.rect(screen, BLACK, (map_x, map_y, map_size, map_size))
-    pygame.draw.rect(screen, WHITE, (map_x, map_y, map_size, map_size), 1)
-    
-    # Draw walls
-    for y in range(MAP_HEIGHT):
-        for x in range(MAP_WIDTH):
-            if MAP[y][x] > 0:
-                pygame.draw.rect(screen, GRAY, 
-                                (map_x + x * cell_size, map_y + y * cell_size, 
-                                 cell_size, cell_size))
-    
-    # Draw player
-    player_map_x = map_x + (player_x / CELL_SIZE) * cell_size
-    player_map_y = map_y + (player_y / CELL_SIZE) * cell_size
-    pygame.draw.circle(screen, GREEN, (int(player_map_x), int(player_map_y)), int(cell_size / 2))
-    
-    # Draw player direction
-    dir_x = player_map_x + math.cos(player_angle) * cell_size
-    dir_y = player_map_y + math.sin(player_angle) * cell_size
-    pygame.draw.line(screen, GREEN, (int(player_map_x), int(player_map_y)), (int(dir_x), int(dir_y)), 2)
-    
-    # Draw enemies
-    for enemy in enemies:
-        if enemy.is_alive:
-            enemy_map_x = map_x + (enemy.x / CELL_SIZE) * cell_size
-            enemy_map_y = map_y + (enemy.y / CELL_SIZE) * cell_size
-            pygame.draw.circle(screen, RED, (int(enemy_map_x), int(enemy_map_y)), int(cell_size / 2))
+    minimap.draw(screen, (SCREEN_WIDTH - minimap.size - 10, 10), MAP, CELL_SIZE,
+                 (player_x, player_y, player_angle), enemy_index)
 
 # Player stats
 player_health = 100
@@ -628,6 +611,13 @@ player_armor = 0
 max_health = 100
 max_armor = 100
 
+# Power-up colors by type
+POWER_UP_COLORS = {
+    "health": GREEN,
+    "armor": BLUE,
+    "ammo": YELLOW
+}
+
 # Power-up class
 class PowerUp:
     def __init__(self, x, y, power_type):
@@ -637,93 +627,87 @@ class PowerUp:
         self.size = CELL_SIZE // 2
         self.is_active = True
         
-        # Create power-up texture
-        self.texture = pygame.Surface((self.size, self.size), pygame.SRCALPHA)
-        
         if power_type == "health":
             self.value = 25
-            self.color = GREEN
-            # Draw health symbol
-            pygame.draw.circle(self.texture, self.color, (self.size // 2, self.size // 2), self.size // 2)
-            pygame.draw.circle(self.texture, WHITE, (self.size // 2, self.size // 2), self.size // 3)
-            pygame.draw.circle(self.texture, self.color, (self.size // 2, self.size // 2), self.size // 4)
         elif power_type == "armor":
             self.value = 25
-            self.color = BLUE
-            # Draw armor symbol
-            pygame.draw.circle(self.texture, self.color, (self.size // 2, self.size // 2), self.size // 2)
-            pygame.draw.circle(self.texture, WHITE, (self.size // 2, self.size // 2), self.size // 3)
-            pygame.draw.rect(self.texture, self.color, (self.size // 4, self.size // 4, self.size // 2, self.size // 2))
         elif power_type == "ammo":
             self.value = 50
-            self.color = YELLOW
-            # Draw ammo symbol
-            pygame.draw.circle(self.texture, self.color, (self.size // 2, self.size // 2), self.size // 2)
-            pygame.draw.rect(self.texture, WHITE, (self.size // 4, self.size // 4, self.size // 2, self.size // 2))
-
-# Create power-ups
-power_ups = [
-    PowerUp(CELL_SIZE * 2.5, CELL_SIZE * 2.5, "health"),
-    PowerUp(CELL_SIZE * 4.5, CELL_SIZE * 4.5, "armor"),
-    PowerUp(CELL_SIZE * 6.5, CELL_SIZE * 3.5, "ammo")
-]
+        self.color = POWER_UP_COLORS[power_type]
+
+def create_power_up_texture(power_type, size):
+    """Draw the texture shared by every power-up of the given type."""
+    texture = pygame.Surface((size, size), pygame.SRCALPHA)
+    color = POWER_UP_COLORS[power_type]
+    
+    if power_type == "health":
+        # Draw health symbol
+        pygame.draw.circle(texture, color, (size // 2, size // 2), size // 2)
+        pygame.draw.circle(texture, WHITE, (size // 2, size // 2), size // 3)
+        pygame.draw.circle(texture, color, (size // 2, size // 2), size // 4)
+    elif power_type == "armor":
+        # Draw armor symbol
+        pygame.draw.circle(texture, color, (size // 2, size // 2), size // 2)
+        pygame.draw.circle(texture, WHITE, (size // 2, size // 2), size // 3)
+        pygame.draw.rect(texture, color, (size // 4, size // 4, size // 2, size // 2))
+    elif power_type == "ammo":
+        # Draw ammo symbol
+        pygame.draw.circle(texture, color, (size // 2, size // 2), size // 2)
+        pygame.draw.rect(texture, WHITE, (size // 4, size // 4, size // 2, size // 2))
+    
+    return texture
+
+for power_type in POWER_UP_COLORS:
+    sprite_registry.register(("power_up", power_type), create_power_up_texture(power_type, CELL_SIZE // 2))
+
+def spawn_power_ups(level):
+    """Create the power-ups listed in a level's spawn table."""
+    return [PowerUp(x, y, power_type) for x, y, power_type in level.power_up_spawns]
+
+# Create power-ups, and an index of the ones not yet picked up
+power_ups = spawn_power_ups(level)
+power_up_index = index_entities(power_ups)
 
 def check_power_up_collision():
     global player_health, player_armor
     
-    for power_up in power_ups:
-        if not power_up.is_active:
-            continue
-            
-        # Calculate distance to power-up
-        dx = player_x - power_up.x
-        dy = player_y - power_up.y
-        distance = math.sqrt(dx * dx + dy * dy)
+    # Check if player picked up any power-ups
+    for distance, power_up in power_up_index.query_radius(player_x, player_y, CELL_SIZE):
+        if power_up.power_type == "health":
+            player_health = min(player_health + power_up.value, max_health)
+        elif power_up.power_type == "armor":
+            player_armor = min(player_armor + power_up.value, max_armor)
+        elif power_up.power_type == "ammo":
+            # Refill all weapons
+            for weapon in weapons.values():
+                weapon.current_ammo = weapon.ammo_capacity
         
-        # Check if player picked up the power-up
-        if distance < CELL_SIZE:
-            if power_up.power_type == "health":
-                player_health = min(player_health + power_up.value, max_health)
-            elif power_up.power_type == "armor":
-                player_armor = min(player_armor + power_up.value, max_armor)
-            elif power_up.power_type == "ammo":
-                # Refill all weapons
-                for weapon in weapons.values():
-                    weapon.current_ammo = weapon.ammo_capacity
-            
-            power_up.is_active = False
-            # Play pickup sound (you'll need to add this)
+        power_up.is_active = False
+        power_up_index.remove(power_up)
+        # Play pickup sound (you'll need to add this)
 
 def render_power_ups():
-    for power_up in power_ups:
-        if power_up.is_active:
-            # Calculate power-up position on screen
-            dx = power_up.x - player_x
-            dy = power_up.y - player_y
-            angle = math.atan2(dy, dx) - player_angle
-            
-            # Normalize angle
-            while angle > math.pi:
-                angle -= 2 * math.pi
-            while angle < -math.pi:
-                angle += 2 * math.pi
-            
-            # Check if power-up is in view
-            if abs(angle) < HALF_FOV:
-                # Calculate distance
-                distance = math.sqrt(dx * dx + dy * dy)
-                
-                # Calculate screen position
-                screen_x = (angle + HALF_FOV) * (SCREEN_WIDTH / FOV)
-                screen_y = SCREEN_HEIGHT // 2
-                
-                # Scale power-up based on distance
-                scale = min(1.0, CELL_SIZE / distance)
-                scaled_size = int(power_up.size * scale)
-                
-                # Draw power-up
-                scaled_texture = pygame.transform.scale(power_up.texture, (scaled_size, scaled_size))
-                screen.blit(scaled_texture, (screen_x - scaled_size // 2, screen_y - scaled_size // 2))
+    """Render the active power-ups as sprites in the 3D view."""
+    view = render_scaler.surface
+    view_width, view_height = view.get_size()
+    
+    # Power-ups in the field of view, with their angle relative to the player's view
+    visible_power_ups = power_up_index.query_cone(player_x, player_y, player_angle, HALF_FOV, MAX_DEPTH * CELL_SIZE)
+    for distance, angle, power_up in visible_power_ups:
+        # Calculate screen position
+        screen_x = view_column(angle, view_width)
+        screen_y = view_height // 2
+        
+        # Scale power-up based on distance
+        scale = min(1.0, CELL_SIZE / distance) * view_height / SCREEN_HEIGHT
+        scaled_size = int(power_up.size * scale)
+        if scaled_size <= 0:
+            continue
+        
+        # Draw the shared power-up texture at the nearest mip level, clipped against the walls
+        sprite = sprite_registry.get(("power_up", power_up.power_type), scaled_size)
+        scaled_size = sprite.get_width()
+        blit_sprite(view, sprite, int(screen_x) - scaled_size // 2, screen_y - scaled_size // 2, distance)
 
 # Game state
 game_state = "playing"  # "playing", "game_over", "win"
@@ -740,20 +724,19 @@ def update_score(points):
     if score > high_score:
         high_score = score
 
-def render_game_over():
+def render_end_screen(title, color):
+    """Darken the view and show title in color over it, with the match stats."""
     # Create semi-transparent overlay
     overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
     overlay.fill(BLACK)
     overlay.set_alpha(128)
     screen.blit(overlay, (0, 0))
     
-    # Game Over text
-    game_over_font = pygame.font.SysFont(None, 74)
-    game_over_text = game_over_font.render("GAME OVER", True, RED)
-    screen.blit(game_over_text, (SCREEN_WIDTH // 2 - game_over_text.get_width() // 2, SCREEN_HEIGHT // 3))
+    # Title text
+    title_text = hud_text.render(title, color, 74)
+    screen.blit(title_text, (SCREEN_WIDTH // 2 - title_text.get_width() // 2, SCREEN_HEIGHT // 3))
     
     # Stats
-    stats_font = pygame.font.SysFont(None, 36)
     stats = [
         f"Score: {score}",
         f"High Score: {high_score}",
@@ -764,120 +747,216 @@ def render_game_over():
     ]
     
     for i, stat in enumerate(stats):
-        text = stats_font.render(stat, True, WHITE)
+        text = hud_text.render(stat, WHITE)
         screen.blit(text, (SCREEN_WIDTH // 2 - text.get_width() // 2, SCREEN_HEIGHT // 2 + i * 40))
 
-def reset_game():
+def render_game_over():
+    """Render the game over screen."""
+    render_end_screen("GAME OVER", RED)
+
+def render_win_screen():
+    """Render the screen shown when every enemy has been killed."""
+    render_end_screen("YOU WIN", GREEN)
+
+def reset_game(new_level=None):
+    """Restart the current level, or switch to new_level if one is given."""
     global player_health, player_armor, score, kills, game_state
     global player_x, player_y, player_angle
-    global enemies, power_ups, weapons
+    global enemy_store, enemies, power_ups, weapons, total_enemies
+    global enemy_index, power_up_index
+    global level, MAP, MAP_WIDTH, MAP_HEIGHT
+    
+    # Switch to the new level
+    if new_level is not None:
+        level = new_level
+        MAP = level.game_map
+        MAP_WIDTH = MAP.width
+        MAP_HEIGHT = MAP.height
     
     # Reset player
     player_health = max_health
     player_armor = 0
-    player_x = CELL_SIZE * 1.5
-    player_y = CELL_SIZE * 1.5
-    player_angle = math.pi / 4
+    player_x, player_y, player_angle = level.player_start
     
     # Reset game state
     score = 0
     kills = 0
     game_state = "playing"
     
-    # Reset enemies
-    enemies = [
-        Enemy(CELL_SIZE * 3.5, CELL_SIZE * 3.5, "imp"),
-        Enemy(CELL_SIZE * 5.5, CELL_SIZE * 5.5, "cacodemon"),
-        Enemy(CELL_SIZE * 7.5, CELL_SIZE * 2.5, "baron")
-    ]
-    
-    # Reset power-ups
-    power_ups = [
-        PowerUp(CELL_SIZE * 2.5, CELL_SIZE * 2.5, "health"),
-        PowerUp(CELL_SIZE * 4.5, CELL_SIZE * 4.5, "armor"),
-        PowerUp(CELL_SIZE * 6.5, CELL_SIZE * 3.5, "ammo")
-    ]
+    # Reset enemies and power-ups from the level's spawn tables
+    enemy_store, enemies = spawn_enemies(level)
+    enemy_index = index_entities(enemies)
+    total_enemies = len(enemies)
+    power_ups = spawn_power_ups(level)
+    power_up_index = index_entities(power_ups)
     
     # Reset weapons
     for weapon in weapons.values():
         weapon.current_ammo = weapon.ammo_capacity
         weapon.is_reloading = False
+        weapon.last_fire_time = 0
+        weapon.reload_start_time = 0
+        weapon.current_frame = 0
+        weapon.last_frame_update = 0
+    weapon_state["current"] = "pistol"
+    weapon_state["firing"] = False
+    weapon_state["last_fire_time"] = 0
+    
+    # Nothing to interpolate from in the new game
+    save_previous_state()
 
-# Update the main game loop to handle game over state
 def update_game_state():
-    global game_state, kills
+    """Run the world for one tick and return the new game state.
+    
+    Picks up the power-ups the player touches, then moves every enemy and
+    applies their attacks as one batch: all enemies are updated in a single
+    EnemyStore.update() call, and the damage of every attacker of the tick
+    goes to armor first and the rest to health at once. The game is lost
+    when health runs out and won when every enemy has been killed. The cost
+    is a few array operations plus one index update per moving enemy, so
+    the main loop and headless matches can run it on large crowds.
+    """
+    global player_health, player_armor
     
-    current_time = pygame.time.get_ticks()
+    current_time = game_clock.get_ticks()
     
     # Check for power-up collisions
     check_power_up_collision()
     
-    # Update enemies
-    for enemy in enemies:
-        if enemy.update(player_x, player_y, current_time):
-            # Enemy is attacking
-            damage = enemy.damage
-            # Apply armor first
-            if player_armor > 0:
-                if player_armor >= damage:
-                    player_armor -= damage
-                    damage = 0
-                else:
-                    damage -= player_armor
-                    player_armor = 0
-            # Apply remaining damage to health
-            player_health -= damage
-            if player_health <= 0:
-                return "game_over"
-    
-    # Check for win condition
+    # Move every enemy and find the attackers in one batched step
+    moved, attackers = enemy_store.update(player_x, player_y, current_time)
+    enemy_index.move_many([enemies[index] for index in moved.tolist()],
+                          enemy_store.x[moved].tolist(), enemy_store.y[moved].tolist())
+    
+    # Total damage of the tick, with armor absorbing as much as it can
+    damage = int(enemy_store.damage[attackers].sum())
+    absorbed = min(player_armor, damage)
+    player_armor -= absorbed
+    player_health = max(player_health - (damage - absorbed), 0)
+    
+    # Check for lose and win conditions
+    if player_health <= 0:
+        return "game_over"
     if kills >= total_enemies:
         return "win"
-    
     return "playing"
 
-# Main game loop
-running = True
-while running:
-    # Keep the loop running at the right speed
-    dt = clock.tick(60) / 1000.0  # Delta time in seconds
+def handle_event(event):
+    """Apply one input event; returns False if it asks to quit the game."""
+    if event.type == QUIT:
+        return False
+    elif event.type == KEYDOWN:
+        if event.key == K_ESCAPE:
+            return False
+        elif event.key == K_r and game_state in ["game_over", "win"]:
+            reset_game()
+        elif event.key == K_SPACE and game_state == "playing":
+            current_time = game_clock.get_ticks()
+            weapon = weapons[weapon_state["current"]]
+            if weapon.fire(current_time):
+                weapon_state["firing"] = True
+                weapon_state["last_fire_time"] = current_time
+                # Play shooting sound
+                if shoot_sound:
+                    shoot_sound.play()
+        elif event.key == K_r:
+            current_time = game_clock.get_ticks()
+            weapon = weapons[weapon_state["current"]]
+            if weapon.reload(current_time):
+                # Play reload sound (you'll need to add this)
+                pass
+        elif event.key == K_1:
+            weapon_state["current"] = "pistol"
+        elif event.key == K_2:
+            weapon_state["current"] = "shotgun"
+        elif event.key == K_3:
+            weapon_state["current"] = "plasma"
+        elif event.key == K_MINUS:
+            if render_scaler.step_down():
+                resize_view()
+        elif event.key == K_EQUALS:
+            if render_scaler.step_up():
+                resize_view()
+        elif event.key == K_F5 and args.level:
+            # Keep playing the current level if the file is missing, half-written or invalid
+            try:
+                new_level = load_level(args.level)
+            except (OSError, ValueError) as error:
+                print(f"Could not reload level: {error}", file=sys.stderr)
+            else:
+                reset_game(new_level)
+        elif event.key == K_F2:
+            if render_scaler.toggle_dynamic():
+                resize_view()
+        elif event.key == K_F3:
+            profiler.visible = not profiler.visible
+    elif event.type == MOUSEBUTTONDOWN and event.button == 1 and game_state == "playing":
+        fire_weapon()
+    return True
+
+# Player pose and enemy positions before the last simulation tick, which
+# frames drawn between ticks are interpolated from
+previous_pose = (player_x, player_y, player_angle)
+previous_enemy_positions = (enemy_store.x[:0], enemy_store.y[:0])
+
+def save_previous_state():
+    """Remember the player pose and the enemy positions before a tick changes them."""
+    global previous_pose, previous_enemy_positions
+    previous_pose = (player_x, player_y, player_angle)
+    count = len(enemy_store)
+    previous_enemy_positions = (enemy_store.x[:count].copy(), enemy_store.y[:count].copy())
+
+@contextmanager
+def interpolated_state(alpha):
+    """Move the player and the enemies alpha of the way from the previous tick to the current one.
+    
+    Inside the with block the renderers see the in-between positions
+    without knowing about them; the simulated state is put back on exit.
+    """
+    global player_x, player_y, player_angle
+    pose = (player_x, player_y, player_angle)
+    enemy_x, enemy_y = enemy_store.x, enemy_store.y
+    if alpha < 1:
+        previous_x, previous_y, previous_angle = previous_pose
+        # Turn the short way round when the angle wrapped around 0
+        turn = (player_angle - previous_angle + math.pi) % (2 * math.pi) - math.pi
+        player_x = previous_x + (player_x - previous_x) * alpha
+        player_y = previous_y + (player_y - previous_y) * alpha
+        player_angle = (previous_angle + turn * alpha) % (2 * math.pi)
+        
+        previous_x, previous_y = previous_enemy_positions
+        count = len(previous_x)
+        enemy_store.x = enemy_x.copy()
+        enemy_store.y = enemy_y.copy()
+        enemy_store.x[:count] += (previous_x - enemy_x[:count]) * (1 - alpha)
+        enemy_store.y[:count] += (previous_y - enemy_y[:count]) * (1 - alpha)
+    try:
+        yield
+    finally:
+        player_x, player_y, player_angle = pose
+        enemy_store.x, enemy_store.y = enemy_x, enemy_y
+
+def step_game(events, keys):
+    """Advance the game by one simulation tick of 1 / TICK_RATE seconds.
+    
+    events are the input events since the last tick and keys the held keys,
+    indexable by key constant like pygame.key.get_pressed(). Nothing is
+    drawn. Returns False if the input asks to quit the game.
+    """
+    global player_x, player_y, player_angle, game_state
+    
+    game_clock.tick()
+    save_previous_state()
     
     # Process events
-    for event in pygame.event.get():
-        if event.type == QUIT:
+    running = True
+    for event in events:
+        if not handle_event(event):
             running = False
-        elif event.type == KEYDOWN:
-            if event.key == K_ESCAPE:
-                running = False
-            elif event.key == K_r and game_state in ["game_over", "win"]:
-                reset_game()
-            elif event.key == K_SPACE and game_state == "playing":
-                current_time = pygame.time.get_ticks()
-                weapon = weapons[weapon_state["current"]]
-                if weapon.fire(current_time):
-                    weapon_state["firing"] = True
-                    weapon_state["last_fire_time"] = current_time
-                    # Play shooting sound
-                    if shoot_sound:
-                        shoot_sound.play()
-            elif event.key == K_r:
-                current_time = pygame.time.get_ticks()
-                weapon = weapons[weapon_state["current"]]
-                if weapon.reload(current_time):
-                    # Play reload sound (you'll need to add this)
-                    pass
-            elif event.key == K_1:
-                weapon_state["current"] = "pistol"
-            elif event.key == K_2:
-                weapon_state["current"] = "shotgun"
-            elif event.key == K_3:
-                weapon_state["current"] = "plasma"
-        elif event.type == MOUSEBUTTONDOWN and event.button == 1 and game_state == "playing":
-            fire_weapon()
     
     if game_state == "playing":
-        # Handle player movement
-        keys = pygame.key.get_pressed()
+        # Finish reloads and advance the weapon animation
+        weapons[weapon_state["current"]].update(game_clock.get_ticks())
         
         # Movement direction
         move_x = 0
@@ -915,34 +994,152 @@ while running:
         if not check_collision(player_x, new_y + PLAYER_SIZE) and not check_collision(player_x, new_y - PLAYER_SIZE):
             player_y = new_y
         
-        # Check win condition (all enemies defeated)
-        all_enemies_defeated = True
-        for enemy in enemies:
-            if enemy.is_alive:
-                all_enemies_defeated = False
-                break
+        # Power-up pickups, enemy AI and attacks, and the win and lose checks
+        game_state = update_game_state()
+    
+    return running
+
+# Frame time per stage of the main loop; F3 shows the percentiles
+profiler = FrameProfiler(["update", "walls", "enemies", "power_ups", "present",
+                          "weapon", "hud", "minimap", "screens", "overlay", "display"])
+
+def render_frame(alpha=1.0):
+    """Render the game for the current state.
+    
+    alpha is where the frame falls between the last two simulation ticks,
+    from 0 at the previous tick to 1 at the current one; moving things are
+    drawn at their positions interpolated to that point.
+    """
+    with interpolated_state(alpha):
+        if game_state == "playing":
+            render_walls()
+            profiler.lap("walls")
+            render_enemies()
+            profiler.lap("enemies")
+            render_power_ups()
+            profiler.lap("power_ups")
+            render_scaler.present(screen)
+            profiler.lap("present")
+            render_weapon()
+            profiler.lap("weapon")
+            render_hud()
+            profiler.lap("hud")
+            render_minimap()
+            profiler.lap("minimap")
+        elif game_state == "game_over":
+            render_walls()  # Keep the 3D view visible
+            profiler.lap("walls")
+            render_scaler.present(screen)
+            profiler.lap("present")
+            render_game_over()
+            profiler.lap("screens")
+        elif game_state == "win":
+            render_walls()
+            profiler.lap("walls")
+            render_scaler.present(screen)
+            profiler.lap("present")
+            render_win_screen()
+            profiler.lap("screens")
+        
+        if profiler.visible:
+            profiler.draw(screen, hud_text, (10, 10))
+            profiler.lap("overlay")
+
+def run_headless(frames, input_source, render=False, new_level=None):
+    """Play one match without a window, as fast as possible, and return its outcome.
+    
+    The match starts from the level start on a fresh game clock, so the
+    outcome depends only on the level and the input. Every frame is one
+    simulation tick. input_source is polled once per frame; it is a ScriptedInput or anything with the same poll()
+    method, such as a bot. The match ends after the given number of frames,
+    when the game is won or lost, or when the input quits. Frames are only
+    drawn, off-screen, if render is True. new_level, if given, replaces the
+    current level first, e.g. to load-test the enemy AI on a large crowd.
+    """
+    global game_clock
+    game_clock = SimulatedClock(1000 / TICK_RATE)
+    reset_game(new_level)
+    
+    frame = 0
+    while frame < frames:
+        frame += 1
+        profiler.begin_frame()
+        events, keys = input_source.poll()
+        running = step_game(events, keys)
+        profiler.lap("update")
+        if render:
+            render_frame()
+        profiler.end_frame()
+        if not running or game_state != "playing":
+            break
+    
+    return {
+        "frames": frame,
+        "time_ms": game_clock.get_ticks(),
+        "state": game_state,
+        "health": player_health,
+        "armor": player_armor,
+        "enemies_left": len(enemy_index),
+        "kills": kills,
+        "score": score,
+        "player": [player_x, player_y, player_angle],
+    }
+
+def main():
+    """Run the game in a window until the player quits.
+    
+    The simulation advances at a fixed TICK_RATE ticks per second while
+    frames are rendered as fast as MAX_FPS allows. Each frame runs as many
+    ticks as the real time since the last one covers, and the time left
+    over, less than a tick, decides how far between the last two ticks the
+    frame is drawn. On a slow machine frames are skipped, rather than the
+    world slowing down.
+    """
+    tick_ms = 1000 / TICK_RATE
+    accumulator = 0.0
+    events = []
+    running = True
+    while running:
+        # Real time since the last frame, capped so that after a long stall
+        # the game does not spend several frames catching up
+        accumulator = min(accumulator + clock.tick(MAX_FPS), MAX_TICKS_PER_FRAME * tick_ms)
+        
+        # Let dynamic resolution react to the work time of the last frame
+        if render_scaler.record_frame_time(clock.get_rawtime()):
+            resize_view()
         
-        if all_enemies_defeated:
-            game_state = "win"
+        profiler.begin_frame()
+        
+        # Run the ticks that are due; input waits for the next tick, so
+        # none is lost on frames that run no tick
+        events.extend(pygame.event.get())
+        keys = pygame.key.get_pressed()
+        while running and accumulator >= tick_ms:
+            running = step_game(events, keys)
+            events = []
+            accumulator -= tick_ms
+        profiler.lap("update")
+        
+        # Render the game between the last two ticks
+        render_frame(accumulator / tick_ms)
+        
+        # Flip the display
+        pygame.display.flip()
+        profiler.lap("display")
+        profiler.end_frame()
     
-    # Render the game
-    if game_state == "playing":
-        render_walls()
-        render_enemies()
-        render_weapon()
-        render_power_ups()
-        render_hud()
-        render_minimap()
-    elif game_state == "game_over":
-        render_walls()  # Keep the 3D view visible
-        render_game_over()
-    elif game_state == "win":
-        render_walls()
-        render_win_screen()
-    
-    # Flip the display
-    pygame.display.flip()
-
-# Quit the game
-pygame.quit()
-sys.exit()
+    if args.profile:
+        profiler.dump(args.profile)
+    
+    # Quit the game
+    pygame.quit()
+    sys.exit()
+
+if __name__ == '__main__':
+    if HEADLESS:
+        script = ScriptedInput.load(args.script) if args.script else ScriptedInput([])
+        print(json.dumps(run_headless(args.frames, script, args.render)))
+        if args.profile:
+            profiler.dump(args.profile)
+    else:
+        main()
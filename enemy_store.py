@@ -0,0 +1,128 @@
+import numpy as np
+
+# Enemy type-specific attributes
+ENEMY_TYPES = {
+    "imp": {"health": 100, "speed": 2, "attack_range": 200, "damage": 10, "attack_rate": 1000},
+    "cacodemon": {"health": 150, "speed": 3, "attack_range": 300, "damage": 15, "attack_rate": 800},
+    "baron": {"health": 300, "speed": 1.5, "attack_range": 400, "damage": 25, "attack_rate": 1500}
+}
+
+
+class EnemyStore:
+    """Enemy state held as NumPy columns, one row per enemy.
+
+    Keeping positions, health, speeds and attack timers in flat arrays lets
+    update() move every enemy and find every attacker in a few vectorized
+    operations instead of one Python method call per enemy. Rows are never
+    removed; dead enemies stay in place with alive set to False.
+    """
+
+    FLOAT_COLUMNS = ("x", "y", "health", "speed", "attack_range", "damage",
+                     "attack_rate", "last_attack_time", "size")
+
+    def __init__(self, capacity=16):
+        self.count = 0
+        self.type_names = list(ENEMY_TYPES)
+        for name in self.FLOAT_COLUMNS:
+            setattr(self, name, np.zeros(capacity))
+        self.type_id = np.zeros(capacity, dtype=np.int8)
+        self.alive = np.zeros(capacity, dtype=bool)
+
+    def __len__(self):
+        return self.count
+
+    def spawn(self, x, y, enemy_type, size):
+        """Add an enemy of the given type and return its row index."""
+        if self.count == len(self.alive):
+            self._grow()
+
+        index = self.count
+        stats = ENEMY_TYPES[enemy_type]
+        self.x[index] = x
+        self.y[index] = y
+        self.size[index] = size
+        self.last_attack_time[index] = 0
+        for name, value in stats.items():
+            getattr(self, name)[index] = value
+        self.type_id[index] = self.type_names.index(enemy_type)
+        self.alive[index] = True
+        self.count += 1
+        return index
+
+    def update(self, player_x, player_y, current_time):
+        """Move every living enemy in range towards the player.
+
+        Returns (moved, attackers): the row indices of the enemies that moved,
+        and of those close enough to attack whose cooldown has run out. The
+        attackers' cooldowns are restarted.
+        """
+        count = self.count
+        x = self.x[:count]
+        y = self.y[:count]
+
+        # Calculate distance to player
+        dx = player_x - x
+        dy = player_y - y
+        distance = np.hypot(dx, dy)
+
+        # Move towards player if within attack range
+        chasing = self.alive[:count] & (distance < self.attack_range[:count])
+        moved = np.nonzero(chasing & (distance > 0))[0]
+        step = self.speed[moved] / distance[moved]
+        x[moved] += dx[moved] * step
+        y[moved] += dy[moved] * step
+
+        # Attack if within range and cooldown is ready
+        attacking = (chasing & (distance < self.size[:count] * 2) &
+                     (current_time - self.last_attack_time[:count] >= self.attack_rate[:count]))
+        attackers = np.nonzero(attacking)[0]
+        self.last_attack_time[attackers] = current_time
+        return moved, attackers
+
+    def take_damage(self, index, damage):
+        """Apply damage to one enemy; returns True if it died."""
+        self.health[index] -= damage
+        if self.alive[index] and self.health[index] <= 0:
+            self.alive[index] = False
+            return True  # Enemy died
+        return False
+
+    def _grow(self):
+        """Double the capacity of every column."""
+        for name in self.FLOAT_COLUMNS + ("type_id", "alive"):
+            column = getattr(self, name)
+            grown = np.zeros(max(1, len(column) * 2), dtype=column.dtype)
+            grown[:len(column)] = column
+            setattr(self, name, grown)
+
+
+def _column_property(name, convert):
+    """Return a property reading the handle's row of an EnemyStore column."""
+    return property(lambda self: convert(getattr(self.store, name)[self.index]),
+                    doc=f"The enemy's {name.replace('_', ' ')}, read from the store.")
+
+
+class Enemy:
+    """Handle on one row of an EnemyStore with the attributes of a single enemy."""
+
+    __slots__ = ("store", "index")
+
+    def __init__(self, store, index):
+        self.store = store
+        self.index = index
+
+    x = _column_property("x", float)
+    y = _column_property("y", float)
+    size = _column_property("size", int)
+    health = _column_property("health", float)
+    damage = _column_property("damage", int)
+    is_alive = _column_property("alive", bool)
+
+    @property
+    def enemy_type(self):
+        """The enemy's type name, a key of ENEMY_TYPES."""
+        return self.store.type_names[self.store.type_id[self.index]]
+
+    def take_damage(self, damage):
+        """Apply damage to this enemy; returns True if it died."""
+        return self.store.take_damage(self.index, damage)
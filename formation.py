@@ -0,0 +1,109 @@
+class Formation:
+    """A rigid grid of enemies that moves as one.
+
+    The whole formation is described by the position of its first slot,
+    its speed and a bitmap of the living enemies, with bit row * cols + col
+    set for each slot still occupied. Moving, turning at the screen edges
+    and finding the enemies under a rect all work on that state directly,
+    so their cost does not depend on the number of enemies.
+    """
+
+    def __init__(self, rows, cols, spacing, enemy_size):
+        self.rows = rows
+        self.cols = cols
+        self.spacing = spacing
+        self.enemy_size = enemy_size
+        self._row_bits = (1 << cols) - 1
+        self.reset(0, 0, 0)
+
+    def reset(self, left, top, speed):
+        """Fill every slot, with the first slot at (left, top), moving at speed."""
+        self.left = left
+        self.top = top
+        self.speed = speed
+        self.alive = (1 << (self.rows * self.cols)) - 1
+        self.count = self.rows * self.cols
+        self._update_extent()
+
+    def __len__(self):
+        return self.count
+
+    def _update_extent(self):
+        """Recompute the first and last occupied rows and columns."""
+        column_bits = 0
+        occupied_rows = []
+        for row in range(self.rows):
+            row_bits = (self.alive >> (row * self.cols)) & self._row_bits
+            if row_bits:
+                column_bits |= row_bits
+                occupied_rows.append(row)
+        if column_bits:
+            self.first_col = (column_bits & -column_bits).bit_length() - 1
+            self.last_col = column_bits.bit_length() - 1
+            self.first_row = occupied_rows[0]
+            self.last_row = occupied_rows[-1]
+        else:
+            self.first_col = self.last_col = self.first_row = self.last_row = None
+
+    def is_alive(self, row, col):
+        """Return True if the slot (row, col) holds a living enemy."""
+        return bool(self.alive >> (row * self.cols + col) & 1)
+
+    def kill(self, row, col):
+        """Destroy the enemy in the slot (row, col)."""
+        bit = 1 << (row * self.cols + col)
+        if self.alive & bit:
+            self.alive &= ~bit
+            self.count -= 1
+            self._update_extent()
+
+    def positions(self):
+        """Yield (x, y) of every living enemy, in slot order."""
+        for index in range(self.rows * self.cols):
+            if self.alive >> index & 1:
+                row, col = divmod(index, self.cols)
+                yield self.left + col * self.spacing, self.top + row * self.spacing
+
+    def bounds(self):
+        """Return (left, top, right, bottom) around the living enemies, or None if none are left."""
+        if not self.count:
+            return None
+        return (self.left + self.first_col * self.spacing,
+                self.top + self.first_row * self.spacing,
+                self.left + self.last_col * self.spacing + self.enemy_size,
+                self.top + self.last_row * self.spacing + self.enemy_size)
+
+    def step(self, width, drop):
+        """Move one frame sideways; at an edge of the screen, turn around and drop.
+
+        Only the outermost living columns can reach an edge. Returns True if
+        the formation turned.
+        """
+        self.left += self.speed
+        bounds = self.bounds()
+        if bounds is None:
+            return False
+        left, top, right, bottom = bounds
+        if right > width or left < 0:
+            self.speed = -self.speed
+            self.top += drop
+            return True
+        return False
+
+    def colliding(self, rect):
+        """Return the (row, col) slots of the living enemies that overlap rect, in slot order."""
+        spacing = self.spacing
+        size = self.enemy_size
+
+        # Rows and columns of the slots that reach into rect
+        first_row = max(0, int((rect.top - self.top - size) // spacing) + 1)
+        last_row = min(self.rows - 1, int((rect.bottom - 1 - self.top) // spacing))
+        first_col = max(0, int((rect.left - self.left - size) // spacing) + 1)
+        last_col = min(self.cols - 1, int((rect.right - 1 - self.left) // spacing))
+
+        found = []
+        for row in range(first_row, last_row + 1):
+            for col in range(first_col, last_col + 1):
+                if self.alive >> (row * self.cols + col) & 1:
+                    found.append((row, col))
+        return found
@@ -0,0 +1,112 @@
+import json
+import time
+
+import numpy as np
+import pygame
+
+PERCENTILES = (50, 95, 99)
+
+
+class FrameProfiler:
+    """Wall time of each stage of the last frames, kept in a ring buffer.
+
+    A frame is timed as a run of stages: begin_frame() starts it, each
+    lap(stage) charges the time since the previous lap to that stage, and
+    end_frame() records the frame's total along with its stages. Each call
+    reads the clock once, so it is cheap enough to leave on all the time.
+    Only the last capacity frames are kept, and the percentiles are taken
+    over those.
+
+    The overlay drawn by draw() is shown when visible is True; its numbers
+    are refreshed every refresh_frames frames to keep drawing it cheap and
+    the text readable.
+    """
+
+    def __init__(self, stages, capacity=600, budget_ms=1000 / 60, refresh_frames=30):
+        self.stages = list(stages)
+        self.columns = {stage: column for column, stage in enumerate(self.stages)}
+        self.capacity = capacity
+        self.budget_ms = budget_ms
+        self.refresh_frames = refresh_frames
+        self.visible = False
+        # One row per frame: the seconds of each stage, then the frame's total
+        self.times = np.zeros((capacity, len(self.stages) + 1))
+        self.count = 0
+        self._row = np.zeros(len(self.stages) + 1)
+        self._start = self._last = time.perf_counter()
+        self._lines = None  # overlay text, rebuilt when refreshed
+        self._panel = None
+
+    def begin_frame(self):
+        """Start timing a frame."""
+        self._row[:] = 0
+        self._start = self._last = time.perf_counter()
+
+    def lap(self, stage):
+        """Charge the time since the previous lap, or since the frame began, to stage."""
+        now = time.perf_counter()
+        self._row[self.columns[stage]] += now - self._last
+        self._last = now
+
+    def end_frame(self):
+        """Finish timing the frame and record it."""
+        self._row[-1] = time.perf_counter() - self._start
+        self.times[self.count % self.capacity] = self._row
+        self.count += 1
+        if self.count % self.refresh_frames == 0:
+            self._lines = None
+
+    def percentiles(self):
+        """Return {stage: {"p50": ms, "p95": ms, "p99": ms}} over the recorded frames.
+
+        The whole frame's time is reported as the stage "frame".
+        """
+        recorded = self.times[:min(self.count, self.capacity)]
+        if len(recorded) == 0:
+            recorded = np.zeros((1, len(self.stages) + 1))
+        values = np.percentile(recorded, PERCENTILES, axis=0) * 1000
+        return {stage: {f"p{q}": float(values[i, column]) for i, q in enumerate(PERCENTILES)}
+                for column, stage in enumerate(self.stages + ["frame"])}
+
+    def summary(self):
+        """Return the percentiles and how often the frame budget was blown, as JSON-ready data."""
+        recorded = self.times[:min(self.count, self.capacity)]
+        over_budget = np.count_nonzero(recorded[:, -1] * 1000 > self.budget_ms)
+        return {
+            "frames": self.count,
+            "window": len(recorded),
+            "budget_ms": self.budget_ms,
+            "over_budget": int(over_budget),
+            "stages": self.percentiles(),
+        }
+
+    def dump(self, path):
+        """Write the summary to a JSON file."""
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=2)
+
+    def draw(self, surface, text, topleft):
+        """Draw the percentiles table at topleft, using a TextCache; returns the rect drawn."""
+        if self._lines is None:
+            self._lines = [("ms", *(f"p{q}" for q in PERCENTILES))]
+            for stage, values in self.percentiles().items():
+                self._lines.append((stage, *(f"{value:.1f}" for value in values.values())))
+
+        line_height = 18
+        columns = (0, 110, 160, 210)  # left edge of the name, right edges of the numbers
+        size = (230, line_height * len(self._lines) + 8)
+        if self._panel is None or self._panel.get_size() != size:
+            self._panel = pygame.Surface(size)
+            self._panel.set_alpha(170)
+        rect = surface.blit(self._panel, topleft)
+
+        for row, line in enumerate(self._lines):
+            y = rect.top + 4 + row * line_height
+            # Rows over the frame budget at p99 stand out
+            over = row > 0 and float(line[-1]) > self.budget_ms
+            color = (255, 80, 80) if over else (255, 255, 255)
+            surface.blit(text.render(line[0], color, 20), (rect.left + 6, y))
+            for right, value in zip(columns[1:], line[1:]):
+                rendered = text.render(value, color, 20)
+                surface.blit(rendered, (rect.left + right - rendered.get_width(), y))
+        return rect
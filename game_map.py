@@ -0,0 +1,110 @@
+import numpy as np
+
+
+class GameMap:
+    """Tile map stored as one contiguous uint8 array indexed [y, x].
+
+    Cell values keep the meaning of the original nested-list MAP (0 is empty
+    space, anything above 0 is a wall), and map[y][x], len(map) and
+    iteration over rows still work, so code written against the list of
+    lists keeps working. Scalar lookups go through a flat memoryview, which
+    avoids NumPy scalar overhead in hot Python loops, while the cells array
+    gives the raycaster and other batched code direct bulk access.
+
+    Rows handed out by map[y] and iteration are read-only, so a write like
+    map[y][x] = 1 raises instead of bypassing set_cell, which keeps the
+    occupancy pyramid and version in step with the cells.
+    """
+
+    def __init__(self, cells):
+        self.cells = np.ascontiguousarray(cells, dtype=np.uint8)
+        if self.cells.ndim != 2:
+            raise ValueError("map cells must be a 2D grid")
+        self.height, self.width = self.cells.shape
+        self._flat = memoryview(self.cells.reshape(-1))
+        self._rows = self.cells.view()
+        self._rows.flags.writeable = False
+        self._occupancy = None
+        # Counts the changes made through set_cell, so anything built from the
+        # cells can tell when it is out of date
+        self.version = 0
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Create a map from a nested list of rows, such as the MAP literal."""
+        return cls(np.array(rows, dtype=np.uint8))
+
+    def in_bounds(self, x, y):
+        """Return True if the cell (x, y) lies inside the map."""
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def cell(self, x, y):
+        """Return the value of the cell (x, y), which must be inside the map."""
+        return self._flat[y * self.width + x]
+
+    @property
+    def occupancy(self):
+        """OccupancyPyramid over the walls, built on first use."""
+        if self._occupancy is None:
+            self._occupancy = OccupancyPyramid(self.cells)
+        return self._occupancy
+
+    def set_cell(self, x, y, value):
+        """Change the value of the cell (x, y)."""
+        self.cells[y, x] = value
+        self.version += 1
+        if self._occupancy is not None:
+            self._occupancy.update_cell(x, y, value)
+
+    def is_solid(self, x, y):
+        """Return True if the cell (x, y) is a wall or lies outside the map."""
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return self._flat[y * self.width + x] > 0
+        return True
+
+    def __array__(self, dtype=None, copy=None):
+        if dtype is None and not copy:
+            return self._rows
+        return self.cells.astype(dtype if dtype is not None else self.cells.dtype)
+
+    def __getitem__(self, y):
+        return self._rows[y]
+
+    def __len__(self):
+        return self.height
+
+    def __iter__(self):
+        return iter(self._rows)
+
+
+class OccupancyPyramid:
+    """Mip levels of wall occupancy used to skip empty space when casting rays.
+
+    levels[0] marks the wall cells. Each cell of levels[k] covers an aligned
+    2^k x 2^k block of map cells and is True if any of them is a wall; parts
+    of a block that hang over the map edge count as empty. The last level is
+    a single cell covering the whole map.
+    """
+
+    def __init__(self, cells):
+        level = np.asarray(cells) > 0
+        self.levels = [level]
+        while level.shape[0] > 1 or level.shape[1] > 1:
+            level = self._downsample(level)
+            self.levels.append(level)
+
+    @staticmethod
+    def _downsample(level):
+        """Return the next level up, where each cell covers 2x2 cells of level."""
+        height, width = level.shape
+        padded = np.zeros((height + height % 2, width + width % 2), dtype=bool)
+        padded[:height, :width] = level
+        return padded.reshape(padded.shape[0] // 2, 2, padded.shape[1] // 2, 2).any(axis=(1, 3))
+
+    def update_cell(self, x, y, value):
+        """Update every level after the cell (x, y) changed to value."""
+        self.levels[0][y, x] = value > 0
+        for k in range(1, len(self.levels)):
+            x >>= 1
+            y >>= 1
+            self.levels[k][y, x] = self.levels[k - 1][2 * y:2 * y + 2, 2 * x:2 * x + 2].any()
@@ -0,0 +1,156 @@
+import argparse
+import math
+import os
+import struct
+import tempfile
+
+import numpy as np
+
+from enemy_store import ENEMY_TYPES
+from game_map import GameMap
+
+# Binary level file layout (all values little-endian):
+#
+#   header    MAGIC, version (u16), reserved (u16), width (u32), height (u32),
+#             enemy count (u32), power-up count (u32),
+#             player start x, y, angle (f64 each)
+#   grid      width * height uint8 cells, row by row
+#   enemies   one ENTITY_RECORD per enemy spawn
+#   power-ups one ENTITY_RECORD per power-up
+#
+# The grid sits at a fixed offset right after the header so it can be
+# memory-mapped without reading the rest of the file.
+MAGIC = b'DLVL'
+VERSION = 1
+HEADER = struct.Struct('<4sHHIIII3d')
+TYPE_NAME_SIZE = 16  # bytes of a type name in an entity record
+ENTITY_RECORD = struct.Struct(f'<dd{TYPE_NAME_SIZE}s')  # x, y, type name (UTF-8, NUL padded)
+
+CELL_SIZE = 64
+
+# Power-up types the game can spawn; enemy types are the keys of ENEMY_TYPES
+POWER_UP_TYPES = ("health", "armor", "ammo")
+
+
+class Level:
+    """A playable level: the wall grid, the player start and the spawn tables."""
+
+    def __init__(self, game_map, player_start, enemy_spawns, power_up_spawns):
+        self.game_map = game_map
+        self.player_start = player_start  # (x, y, angle) in world units
+        self.enemy_spawns = enemy_spawns  # [(x, y, enemy_type), ...]
+        self.power_up_spawns = power_up_spawns  # [(x, y, power_type), ...]
+
+
+def default_level():
+    """Return the built-in level that doom.py originally hard-coded."""
+    game_map = GameMap.from_rows([
+        [1, 1, 1, 1, 1, 1, 1, 1, 1, 1],
+        [1, 0, 0, 0, 0, 0, 0, 0, 0, 1],
+        [1, 0, 0, 0, 0, 0, 0, 0, 0, 1],
+        [1, 0, 0, 1, 1, 0, 1, 0, 0, 1],
+        [1, 0, 0, 1, 0, 0, 1, 0, 0, 1],
+        [1, 0, 0, 1, 0, 0, 1, 0, 0, 1],
+        [1, 0, 0, 1, 0, 1, 1, 0, 0, 1],
+        [1, 0, 0, 0, 0, 0, 0, 0, 0, 1],
+        [1, 0, 0, 0, 0, 0, 0, 0, 0, 1],
+        [1, 1, 1, 1, 1, 1, 1, 1, 1, 1]
+    ])
+    player_start = (CELL_SIZE * 1.5, CELL_SIZE * 1.5, math.pi / 4)
+    enemy_spawns = [
+        (CELL_SIZE * 3.5, CELL_SIZE * 3.5, "imp"),
+        (CELL_SIZE * 5.5, CELL_SIZE * 5.5, "cacodemon"),
+        (CELL_SIZE * 7.5, CELL_SIZE * 2.5, "baron")
+    ]
+    power_up_spawns = [
+        (CELL_SIZE * 2.5, CELL_SIZE * 2.5, "health"),
+        (CELL_SIZE * 4.5, CELL_SIZE * 4.5, "armor"),
+        (CELL_SIZE * 6.5, CELL_SIZE * 3.5, "ammo")
+    ]
+    return Level(game_map, player_start, enemy_spawns, power_up_spawns)
+
+
+def save_level(level, path):
+    """Write a level to path in the binary level format.
+
+    Raises ValueError, before anything is written, if an entity type name
+    does not fit in TYPE_NAME_SIZE bytes of UTF-8.
+
+    The level is written to a temporary file next to path, which then
+    replaces path. A game that has the old file's grid memory-mapped keeps
+    reading the old file, instead of crashing when it is truncated.
+    """
+    game_map = level.game_map
+    records = []
+    for x, y, entity_type in level.enemy_spawns + level.power_up_spawns:
+        name = entity_type.encode('utf-8')
+        if len(name) > TYPE_NAME_SIZE:
+            raise ValueError(f"entity type {entity_type!r} is longer than {TYPE_NAME_SIZE} bytes")
+        records.append(ENTITY_RECORD.pack(x, y, name))
+
+    directory = os.path.dirname(os.path.abspath(path))
+    descriptor, temporary_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.', dir=directory)
+    try:
+        with os.fdopen(descriptor, 'wb') as level_file:
+            level_file.write(HEADER.pack(MAGIC, VERSION, 0, game_map.width, game_map.height,
+                                         len(level.enemy_spawns), len(level.power_up_spawns),
+                                         *level.player_start))
+            level_file.write(game_map.cells.tobytes())
+            level_file.write(b''.join(records))
+        # mkstemp creates the file readable by its owner only; give it the
+        # permissions a plain open() would have
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(temporary_path, 0o666 & ~umask)
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.unlink(temporary_path)
+        raise
+
+
+def load_level(path):
+    """Load a level file, memory-mapping its grid instead of reading it.
+
+    The grid is mapped copy-on-write, so cells can still be changed in game
+    without touching the file on disk. Raises ValueError if the file is not
+    a valid level, including spawns of an enemy or power-up type the game
+    does not know, and OSError if it cannot be read.
+    """
+    with open(path, 'rb') as level_file:
+        header = level_file.read(HEADER.size)
+        if len(header) < HEADER.size:
+            raise ValueError(f"{path}: file is too short to be a level")
+        magic, version, _, width, height, num_enemies, num_power_ups, *player_start = HEADER.unpack(header)
+        if magic != MAGIC:
+            raise ValueError(f"{path}: not a level file")
+        if version != VERSION:
+            raise ValueError(f"{path}: unsupported level version {version}")
+
+        # Spawn tables follow the grid
+        level_file.seek(HEADER.size + width * height)
+        records = level_file.read(ENTITY_RECORD.size * (num_enemies + num_power_ups))
+        if len(records) < ENTITY_RECORD.size * (num_enemies + num_power_ups):
+            raise ValueError(f"{path}: truncated spawn table")
+
+    spawns = []
+    for x, y, entity_type in ENTITY_RECORD.iter_unpack(records):
+        spawns.append((x, y, entity_type.rstrip(b'\0').decode('utf-8')))
+    for index, (x, y, entity_type) in enumerate(spawns):
+        known = ENEMY_TYPES if index < num_enemies else POWER_UP_TYPES
+        if entity_type not in known:
+            raise ValueError(f"{path}: unknown {'enemy' if index < num_enemies else 'power-up'} type {entity_type!r}")
+
+    cells = np.memmap(path, dtype=np.uint8, mode='c', offset=HEADER.size, shape=(height, width))
+    return Level(GameMap(cells), tuple(player_start), spawns[:num_enemies], spawns[num_enemies:])
+
+
+def main():
+    """Convert the built-in level layout into a level file."""
+    parser = argparse.ArgumentParser(description='Write the built-in Doom Python level to a level file')
+    parser.add_argument('output', help='path of the level file to write')
+    args = parser.parse_args()
+    save_level(default_level(), args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+import math
+
+import numpy as np
+import pygame
+
+
+class Minimap:
+    """Overhead map of the walls, the player and the enemies in a square panel.
+
+    The walls never change during play, so they are drawn once into a layer
+    with one pixel per cell, which is only rebuilt when the map is replaced
+    or its version changes. Maps up to max_cells cells across are shown
+    whole. On larger maps the panel shows a window max_cells cells across,
+    centered on the player and scrolling with them, and only that window of
+    the wall layer is scaled up, so the cost of a frame depends on the panel
+    size rather than the area of the map.
+    """
+
+    def __init__(self, size, max_cells=32, background=(0, 0, 0), border=(255, 255, 255),
+                 wall_color=(100, 100, 100), player_color=(0, 255, 0), enemy_color=(255, 0, 0)):
+        self.size = size
+        self.max_cells = max_cells
+        self.background = background
+        self.border = border
+        self.wall_color = wall_color
+        self.player_color = player_color
+        self.enemy_color = enemy_color
+        self._map = None
+        self._map_version = None
+        self._layer = None  # walls, one pixel per cell
+        self._window_key = None
+        self._window = None  # the scaled part of the layer under the panel
+
+    def _wall_layer(self, game_map):
+        """Return the one-pixel-per-cell wall layer of game_map, drawing it if the map changed."""
+        if game_map is not self._map or game_map.version != self._map_version:
+            # An 8-bit layer with a two-color palette takes one byte per cell
+            layer = pygame.Surface((game_map.width, game_map.height), depth=8)
+            layer.set_palette([self.background, self.wall_color])
+            pygame.surfarray.blit_array(layer, (game_map.cells.T > 0).astype(np.uint8))
+            self._layer = layer
+            self._map = game_map
+            self._map_version = game_map.version
+            self._window_key = None
+        return self._layer
+
+    def _scaled_window(self, game_map, left, top, cells, scale, target):
+        """Return the walls of cells x cells cells from (left, top), scaled to the panel.
+
+        The result is in the pixel format of target, which makes drawing it there cheap.
+        """
+        layer = self._wall_layer(game_map)
+        key = (left, top, cells, scale, target.get_bitsize(), target.get_masks())
+        if key != self._window_key:
+            area = pygame.Rect(left, top, cells, cells).clip(layer.get_rect())
+            size = (round(area.width * scale), round(area.height * scale))
+            self._window = pygame.transform.scale(layer.subsurface(area), size).convert(target)
+            self._window_key = key
+        return self._window
+
+    def draw(self, surface, topleft, game_map, cell_size, player, enemy_index):
+        """Draw the minimap with its top-left corner at topleft.
+
+        cell_size is the size of a map cell in world units, player is the
+        player's (x, y, angle) and enemy_index the SpatialHash of the living
+        enemies.
+        """
+        panel = pygame.Rect(topleft, (self.size, self.size))
+        cells_across = min(max(game_map.width, game_map.height), self.max_cells)
+        scale = self.size / cells_across
+
+        # First cell of the window, centered on the player but kept inside the map
+        player_x, player_y, player_angle = player
+        player_cell_x = player_x / cell_size
+        player_cell_y = player_y / cell_size
+        left = min(max(player_cell_x - cells_across / 2, 0), max(game_map.width - cells_across, 0))
+        top = min(max(player_cell_y - cells_across / 2, 0), max(game_map.height - cells_across, 0))
+
+        # Draw map background
+        pygame.draw.rect(surface, self.background, panel)
+        pygame.draw.rect(surface, self.border, panel, 1)
+
+        # Draw walls, from the whole cell the window starts in, shifted by the part cut off
+        clip = surface.get_clip()
+        surface.set_clip(panel.clip(clip))
+        walls = self._scaled_window(game_map, int(left), int(top), cells_across + 1, scale, surface)
+        surface.blit(walls, (panel.x - round((left - int(left)) * scale),
+                             panel.y - round((top - int(top)) * scale)))
+
+        def to_panel(cell_x, cell_y):
+            return int(panel.x + (cell_x - left) * scale), int(panel.y + (cell_y - top) * scale)
+
+        # Draw player
+        center = to_panel(player_cell_x, player_cell_y)
+        pygame.draw.circle(surface, self.player_color, center, int(scale / 2))
+
+        # Draw player direction
+        direction = to_panel(player_cell_x + math.cos(player_angle), player_cell_y + math.sin(player_angle))
+        pygame.draw.line(surface, self.player_color, center, direction, 2)
+
+        # Draw the living enemies inside the window
+        for enemy in enemy_index.query_rect(left * cell_size, top * cell_size,
+                                            (left + cells_across) * cell_size, (top + cells_across) * cell_size):
+            pygame.draw.circle(surface, self.enemy_color, to_panel(enemy.x / cell_size, enemy.y / cell_size),
+                               int(scale / 2))
+        surface.set_clip(clip)
@@ -0,0 +1,125 @@
+from collections import deque
+
+import pygame
+
+
+class RenderScaler:
+    """Owns the low-resolution view surface and its upscale to the window.
+
+    The 3D view is drawn into a surface num_rays pixels wide (one column per
+    ray) with the window's aspect ratio, then scaled up to the window. In
+    dynamic mode the ray count is lowered automatically when recent frames go
+    over the time budget, and raised back towards the configured count once
+    there is headroom again.
+
+    Ray counts move along a fixed ladder of rungs STEP apart, built through
+    the ray count given at startup, so stepping down and back up always
+    returns to exactly the same count.
+    """
+
+    STEP = 0.8  # Ray count multiplier for one step down in resolution
+
+    def __init__(self, window_width, window_height, num_rays, dynamic=False,
+                 frame_budget_ms=1000 / 60, history=30):
+        self.window_width = window_width
+        self.window_height = window_height
+        self.min_rays = max(1, window_width // 8)
+        self.max_rays = window_width
+        self.dynamic = dynamic
+        self.frame_budget_ms = frame_budget_ms
+        self.frame_times = deque(maxlen=history)
+        self.surface = None
+        self.num_rays = 0
+        self.target_rays = 0
+        self.ladder = self._build_ladder(self._clamp(num_rays))
+        self.set_num_rays(num_rays)
+
+    @property
+    def width(self):
+        """Width of the view surface, one pixel per ray."""
+        return self.surface.get_width()
+
+    @property
+    def height(self):
+        """Height of the view surface."""
+        return self.surface.get_height()
+
+    def set_num_rays(self, num_rays):
+        """Set the configured ray count; returns True if the view was resized."""
+        self.target_rays = self._clamp(num_rays)
+        return self._resize(self.target_rays)
+
+    def step_down(self):
+        """Lower the configured resolution by one step."""
+        return self.set_num_rays(self._rung_below(self.target_rays))
+
+    def step_up(self):
+        """Raise the configured resolution by one step."""
+        return self.set_num_rays(self._rung_above(self.target_rays))
+
+    def toggle_dynamic(self):
+        """Switch dynamic resolution on or off, restoring the configured ray count."""
+        self.dynamic = not self.dynamic
+        self.frame_times.clear()
+        return self._resize(self.target_rays)
+
+    def record_frame_time(self, frame_ms):
+        """Feed the work time of one frame; returns True if the view was resized."""
+        if not self.dynamic:
+            return False
+
+        self.frame_times.append(frame_ms)
+        if len(self.frame_times) < self.frame_times.maxlen:
+            return False
+
+        # Only react to a full window of frames so single spikes are ignored
+        average = sum(self.frame_times) / len(self.frame_times)
+        if average > self.frame_budget_ms:
+            return self._resize(self._rung_below(self.num_rays))
+        if average < self.frame_budget_ms * self.STEP * self.STEP and self.num_rays < self.target_rays:
+            return self._resize(min(self.target_rays, self._rung_above(self.num_rays)))
+        return False
+
+    def present(self, target):
+        """Scale the view surface up to fill target."""
+        if self.surface.get_size() == target.get_size():
+            target.blit(self.surface, (0, 0))
+        else:
+            pygame.transform.scale(self.surface, target.get_size(), target)
+
+    def _build_ladder(self, anchor):
+        """Return the ray counts STEP apart through anchor, from min_rays to max_rays, ascending."""
+        rungs = {anchor, self.min_rays, self.max_rays}
+        steps = 1
+        while anchor * self.STEP ** steps > self.min_rays:
+            rungs.add(round(anchor * self.STEP ** steps))
+            steps += 1
+        steps = 1
+        while anchor / self.STEP ** steps < self.max_rays:
+            rungs.add(round(anchor / self.STEP ** steps))
+            steps += 1
+        return sorted(rungs)
+
+    def _rung_below(self, num_rays):
+        """Return the highest rung of the ladder below num_rays, or the lowest rung."""
+        lower = [rung for rung in self.ladder if rung < num_rays]
+        return lower[-1] if lower else self.ladder[0]
+
+    def _rung_above(self, num_rays):
+        """Return the lowest rung of the ladder above num_rays, or the highest rung."""
+        higher = [rung for rung in self.ladder if rung > num_rays]
+        return higher[0] if higher else self.ladder[-1]
+
+    def _clamp(self, num_rays):
+        """Limit a ray count to the supported range."""
+        return max(self.min_rays, min(self.max_rays, int(num_rays)))
+
+    def _resize(self, num_rays):
+        """Recreate the view surface for a new ray count if it changed."""
+        if self.surface is not None and num_rays == self.num_rays:
+            return False
+        self.num_rays = num_rays
+        height = max(1, round(self.window_height * num_rays / self.window_width))
+        self.surface = pygame.Surface((num_rays, height))
+        self.frame_times.clear()
+        return True
@@ -0,0 +1,153 @@
+import json
+import random
+
+import pygame
+from pygame.locals import KEYDOWN, KEYUP, MOUSEBUTTONDOWN
+
+
+class RealClock:
+    """Wall-clock game time, backed by pygame's frame clock and tick counter."""
+
+    def __init__(self):
+        self._clock = pygame.time.Clock()
+
+    def tick(self, framerate=0):
+        """Wait out the rest of the frame and return the milliseconds since the last tick."""
+        return self._clock.tick(framerate)
+
+    def get_rawtime(self):
+        """Return the milliseconds the last frame took before tick() waited."""
+        return self._clock.get_rawtime()
+
+    def get_ticks(self):
+        """Return the milliseconds since pygame was initialized."""
+        return pygame.time.get_ticks()
+
+
+class SimulatedClock:
+    """Deterministic game time that advances a fixed step per tick.
+
+    A drop-in replacement for RealClock when simulating: tick() returns at
+    once and moves time on by exactly frame_ms, so a run depends only on its
+    inputs and goes as fast as the CPU allows.
+    """
+
+    def __init__(self, frame_ms=1000 / 60):
+        self.frame_ms = frame_ms
+        self.frames = 0
+
+    def tick(self, framerate=0):
+        """Advance one frame and return its length in milliseconds."""
+        self.frames += 1
+        return self.frame_ms
+
+    def get_rawtime(self):
+        """Return the length of a frame; simulated frames are always on budget."""
+        return self.frame_ms
+
+    def get_ticks(self):
+        """Return the simulated milliseconds since the clock started."""
+        # Derived from the frame count so no rounding error builds up
+        return int(self.frames * self.frame_ms)
+
+
+class HeldKeys:
+    """Held-key state indexable by key constant, like pygame.key.get_pressed()."""
+
+    def __init__(self, keys=()):
+        self.keys = set(keys)
+
+    def __getitem__(self, key):
+        return key in self.keys
+
+
+class ScriptedInput:
+    """Replays a script of input events frame by frame.
+
+    script is a sequence of (frame, event) pairs, with event a
+    pygame.event.Event. Each poll() returns the events of the next frame and
+    the held keys, which follow the KEYDOWN and KEYUP events like a real
+    keyboard. Anything else with the same poll() method, such as a bot
+    deciding its input from the game state, can stand in for it.
+    """
+
+    def __init__(self, script):
+        self.script = sorted(script, key=lambda entry: entry[0])
+        self.frame = 0
+        self.held = HeldKeys()
+        self._next = 0
+
+    @classmethod
+    def load(cls, path):
+        """Load a script from a JSON file.
+
+        The file holds a list of [frame, action] or [frame, action, key]
+        entries, where action is "down" or "up" for a key (named as in the
+        K_ constants, e.g. "w", "SPACE", "LEFT") or "click" for the left
+        mouse button.
+        """
+        with open(path) as f:
+            entries = json.load(f)
+
+        script = []
+        for entry in entries:
+            frame, action = entry[:2]
+            if action == "click":
+                event = pygame.event.Event(MOUSEBUTTONDOWN, button=1, pos=(0, 0))
+            elif action in ("down", "up"):
+                key = getattr(pygame.locals, "K_" + entry[2])
+                event = pygame.event.Event(KEYDOWN if action == "down" else KEYUP, key=key)
+            else:
+                raise ValueError(f"unknown input action {action!r}")
+            script.append((frame, event))
+        return cls(script)
+
+    def poll(self):
+        """Return (events, keys) for the next frame."""
+        events = []
+        while self._next < len(self.script) and self.script[self._next][0] <= self.frame:
+            event = self.script[self._next][1]
+            self._next += 1
+            if event.type == KEYDOWN:
+                self.held.keys.add(event.key)
+            elif event.type == KEYUP:
+                self.held.keys.discard(event.key)
+            events.append(event)
+        self.frame += 1
+        return events, self.held
+
+
+class RandomInput:
+    """Seeded bot that presses keys at random, for simulating many games.
+
+    Every hold_frames frames it picks one of hold_keys to hold down, or
+    none, and on every frame it presses each of tap_keys with probability
+    tap_chance. The same seed always gives the same input.
+    """
+
+    def __init__(self, hold_keys, tap_keys, seed, hold_frames=15, tap_chance=0.1):
+        self.hold_keys = hold_keys
+        self.tap_keys = tap_keys
+        self.hold_frames = hold_frames
+        self.tap_chance = tap_chance
+        self.random = random.Random(seed)
+        self.frame = 0
+        self.held = HeldKeys()
+
+    def poll(self):
+        """Return (events, keys) for the next frame."""
+        events = []
+        if self.frame % self.hold_frames == 0:
+            choice = self.random.randrange(len(self.hold_keys) + 1)
+            for key in self.held.keys:
+                events.append(pygame.event.Event(KEYUP, key=key))
+            self.held.keys.clear()
+            if choice < len(self.hold_keys):
+                self.held.keys.add(self.hold_keys[choice])
+                events.append(pygame.event.Event(KEYDOWN, key=self.hold_keys[choice]))
+        for key in self.tap_keys:
+            if self.random.random() < self.tap_chance:
+                events.append(pygame.event.Event(KEYDOWN, key=key))
+                events.append(pygame.event.Event(KEYUP, key=key))
+        self.frame += 1
+        return events, self.held
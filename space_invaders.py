@@ -1,24 +1,32 @@
 import pygame
-import random
+import argparse
+import json
 import sys
+from collections import deque
 import os
 from pygame.locals import *
 
+from formation import Formation
+from frame_profiler import FrameProfiler
+from simulation import RandomInput, RealClock, ScriptedInput, SimulatedClock
+from starfield import Starfield
+from text_cache import TextCache
+
 # Initialize pygame vs 5
 pygame.init()
 pygame.font.init()
-pygame.mixer.init()  # Initialize sound mixer
 
 # Constants
 SCREEN_WIDTH = 800
 SCREEN_HEIGHT = 600
 PLAYER_SPEED = 5
-ENEMY_SPEED = 2
+ENEMY_SPEED = 4
 BULLET_SPEED = 7
 ENEMY_ROWS = 5
 ENEMY_COLS = 10
 ENEMY_SPACING = 60
 ENEMY_DROP = 30
+STAR_COUNT = 100
 
 # Colors
 BLACK = (0, 0, 0)
@@ -28,12 +36,38 @@ RED = (255, 0, 0)
 BLUE = (0, 0, 255)
 YELLOW = (255, 255, 0)
 
-# Create the screen
-screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-pygame.display.set_caption('Space Invaders')
+def parse_args(argv=None):
+    """Parse the command-line options, from sys.argv unless argv is given."""
+    parser = argparse.ArgumentParser(description='Space Invaders')
+    parser.add_argument('--headless', action='store_true',
+                        help='simulate games without a window and print their outcomes')
+    parser.add_argument('--games', type=int, default=1,
+                        help='number of independent headless games to run (default: 1)')
+    parser.add_argument('--frames', type=int, default=3600,
+                        help='maximum number of frames of a headless game (default: 3600)')
+    parser.add_argument('--script', metavar='PATH',
+                        help='JSON input script replayed by every headless game; '
+                             'without one each game is played by a randomly acting bot')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the first bot; game i uses seed + i (default: 0)')
+    parser.add_argument('--dirty', action='store_true',
+                        help='update only the changed parts of the screen each frame, '
+                             'for displays where a full flip is slow')
+    parser.add_argument('--profile', metavar='PATH',
+                        help='write frame time percentiles per stage to PATH as JSON on exit')
+    return parser.parse_args(argv)
+
+# The command line only applies when space_invaders.py is run as a script;
+# imported, e.g. by a test harness, the game starts headless
+args = parse_args(None if __name__ == '__main__' else [])
+HEADLESS = args.headless or __name__ != '__main__'
 
-# Clock for controlling game speed
-clock = pygame.time.Clock()
+# Create the screen; headless, frames are drawn off-screen if at all
+if HEADLESS:
+    screen = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+else:
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    pygame.display.set_caption('Space Invaders')
 
 # Sound effects - using simple beeps instead of complex sound generation
 # This avoids the need for NumPy
@@ -44,6 +78,11 @@ game_over_sound = None
 
 # Try to create simple sound effects
 try:
+    if HEADLESS:
+        # Headless machines may have no audio device, and nobody is listening
+        raise pygame.error("no sound when headless")
+    pygame.mixer.init()  # Initialize sound mixer
+    
     # Create a simple beep sound for shooting
     shoot_sound = pygame.mixer.Sound(buffer=bytes([128] * 1000))
     shoot_sound.set_volume(0.2)
@@ -63,13 +102,9 @@ except:
     # If sound creation fails, we'll continue without sound
     pass
 
-# Star background
-stars = []
-for i in range(100):
-    x = random.randrange(0, SCREEN_WIDTH)
-    y = random.randrange(0, SCREEN_HEIGHT)
-    speed = random.randrange(1, 3)
-    stars.append([x, y, speed])
+# Star background: far, dim stars scroll slowly and near, bright ones quickly
+starfield = Starfield(SCREEN_WIDTH, SCREEN_HEIGHT, STAR_COUNT,
+                      [(1, (110, 110, 110)), (2, (180, 180, 180)), (3, WHITE)])
 
 class Player(pygame.sprite.Sprite):
     def __init__(self):
@@ -87,9 +122,8 @@ class Player(pygame.sprite.Sprite):
         self.rect.bottom = SCREEN_HEIGHT - 10
         self.speed_x = 0
     
-    def update(self):
+    def update(self, keystate):
         self.speed_x = 0
-        keystate = pygame.key.get_pressed()
         if keystate[K_LEFT]:
             self.speed_x = -PLAYER_SPEED
         if keystate[K_RIGHT]:
@@ -104,41 +138,28 @@ class Player(pygame.sprite.Sprite):
     
     def shoot(self):
         bullet = Bullet(self.rect.centerx, self.rect.top)
-        all_sprites.add(bullet)
-        bullets.add(bullet)
         # Play shooting sound if available
         if shoot_sound:
             try:
                 shoot_sound.play()
             except:
                 pass
+        return bullet
 
-class Enemy(pygame.sprite.Sprite):
-    def __init__(self, x, y):
-        super().__init__()
-        self.image = pygame.Surface((40, 40), pygame.SRCALPHA)
-        # Draw a more interesting enemy shape
-        pygame.draw.ellipse(self.image, RED, (0, 0, 40, 40))
-        pygame.draw.ellipse(self.image, (200, 0, 0), (10, 10, 20, 20))
-        # Add "eyes"
-        pygame.draw.circle(self.image, WHITE, (15, 15), 5)
-        pygame.draw.circle(self.image, WHITE, (25, 15), 5)
-        pygame.draw.circle(self.image, BLACK, (15, 15), 2)
-        pygame.draw.circle(self.image, BLACK, (25, 15), 2)
-        
-        self.rect = self.image.get_rect()
-        self.rect.x = x
-        self.rect.y = y
-        self.speed_x = ENEMY_SPEED
-        self.move_down = False
-    
-    def update(self):
-        self.rect.x += self.speed_x
-        
-        # Check if any enemy has reached the edge
-        if self.rect.right > SCREEN_WIDTH or self.rect.left < 0:
-            return True
-        return False
+def create_enemy_image():
+    """Draw the enemy image shared by every slot of the formation."""
+    image = pygame.Surface((40, 40), pygame.SRCALPHA)
+    # Draw a more interesting enemy shape
+    pygame.draw.ellipse(image, RED, (0, 0, 40, 40))
+    pygame.draw.ellipse(image, (200, 0, 0), (10, 10, 20, 20))
+    # Add "eyes"
+    pygame.draw.circle(image, WHITE, (15, 15), 5)
+    pygame.draw.circle(image, WHITE, (25, 15), 5)
+    pygame.draw.circle(image, BLACK, (15, 15), 2)
+    pygame.draw.circle(image, BLACK, (25, 15), 2)
+    return image
+
+enemy_image = create_enemy_image()
 
 class Bullet(pygame.sprite.Sprite):
     def __init__(self, x, y):
@@ -158,122 +179,152 @@ class Bullet(pygame.sprite.Sprite):
         if self.rect.bottom < 0:
             self.kill()
 
-class Explosion(pygame.sprite.Sprite):
-    def __init__(self, center):
-        super().__init__()
-        self.size = 20
-        self.image = pygame.Surface((self.size, self.size), pygame.SRCALPHA)
-        pygame.draw.circle(self.image, YELLOW, (self.size//2, self.size//2), self.size//2)
-        self.rect = self.image.get_rect()
-        self.rect.center = center
-        self.frame = 0
-        self.last_update = pygame.time.get_ticks()
-        self.frame_rate = 50  # milliseconds
-
-    def update(self):
-        now = pygame.time.get_ticks()
-        if now - self.last_update > self.frame_rate:
-            self.last_update = now
-            self.frame += 1
-            if self.frame == 1:
-                # Second frame: larger yellow circle
-                self.size = 30
-                self.image = pygame.Surface((self.size, self.size), pygame.SRCALPHA)
-                pygame.draw.circle(self.image, YELLOW, (self.size//2, self.size//2), self.size//2)
-                self.rect = self.image.get_rect(center=self.rect.center)
-            elif self.frame == 2:
-                # Third frame: orange circle
-                self.image = pygame.Surface((self.size, self.size), pygame.SRCALPHA)
-                pygame.draw.circle(self.image, (255, 165, 0), (self.size//2, self.size//2), self.size//2)
-            elif self.frame == 3:
-                # Fourth frame: red circle
-                self.image = pygame.Surface((self.size, self.size), pygame.SRCALPHA)
-                pygame.draw.circle(self.image, RED, (self.size//2, self.size//2), self.size//2)
-            elif self.frame == 4:
-                # Fifth frame: smaller red circle
-                self.size = 20
-                self.image = pygame.Surface((self.size, self.size), pygame.SRCALPHA)
-                pygame.draw.circle(self.image, RED, (self.size//2, self.size//2), self.size//2)
-                self.rect = self.image.get_rect(center=self.rect.center)
-            elif self.frame == 5:
-                # Kill the sprite when the animation is done
-                self.kill()
-
-# Game initialization
-all_sprites = pygame.sprite.Group()
-enemies = pygame.sprite.Group()
-bullets = pygame.sprite.Group()
-explosions = pygame.sprite.Group()
+def create_explosion_frames():
+    """Draw the frames of the explosion animation, shared by every explosion."""
+    frames = []
+    # Small yellow circle, then larger yellow, orange and red circles, then a smaller red one
+    for size, color in ((20, YELLOW), (30, YELLOW), (30, (255, 165, 0)), (30, RED), (20, RED)):
+        image = pygame.Surface((size, size), pygame.SRCALPHA)
+        pygame.draw.circle(image, color, (size//2, size//2), size//2)
+        frames.append(image)
+    return frames
 
-player = Player()
-all_sprites.add(player)
+explosion_frames = create_explosion_frames()
 
-# Create enemies
-def create_enemies():
-    enemies.empty()
-    for row in range(ENEMY_ROWS):
-        for col in range(ENEMY_COLS):
-            enemy = Enemy(col * ENEMY_SPACING + 50, row * ENEMY_SPACING + 50)
-            all_sprites.add(enemy)
-            enemies.add(enemy)
-
-create_enemies()
-
-# Game variables
-score = 0
-game_over = False
-direction_change = False
-font = pygame.font.SysFont(None, 36)
-level = 1
+class Explosions:
+    """Every running explosion, animated from one timeline.
+    
+    An explosion is only its center and start time; the frame it shows
+    follows from the current time, and the frames themselves are drawn once
+    and shared. update() reads the clock once for all of them. Explosions
+    start in time order and all last as long, so finished ones are dropped
+    from the front.
+    """
+    
+    def __init__(self, clock, frames, frame_rate=50):
+        self.clock = clock
+        self.frames = frames
+        self.frame_rate = frame_rate  # milliseconds
+        self.duration = frame_rate * len(frames)
+        self.running = deque()  # (center, start time)
+        self.now = clock.get_ticks()
+        # Offsets from the center of each frame to its top-left corner
+        self.offsets = [(frame.get_width() // 2, frame.get_height() // 2) for frame in frames]
+    
+    def __len__(self):
+        return len(self.running)
+    
+    def add(self, center):
+        """Start an explosion centered on center."""
+        self.running.append((center, self.now))
+    
+    def update(self):
+        """Advance the timeline to the current time and drop finished explosions."""
+        self.now = self.clock.get_ticks()
+        while self.running and self.now - self.running[0][1] >= self.duration:
+            self.running.popleft()
+    
+    def draw(self, surface):
+        """Draw the current frame of every explosion and return the rects drawn."""
+        blits = []
+        for (x, y), start in self.running:
+            index = (self.now - start) // self.frame_rate
+            offset_x, offset_y = self.offsets[index]
+            blits.append((self.frames[index], (x - offset_x, y - offset_y)))
+        return surface.blits(blits)
 
-# Main game loop
-running = True
-while running:
-    # Keep the loop running at the right speed
-    clock.tick(60)
-    
-    # Process events
-    for event in pygame.event.get():
+class SpaceInvadersGame:
+    """The state and rules of one game: player, enemies, bullets, score and level.
+    
+    Games are independent of each other and of the window, so any number of
+    them can run in one process. Game time comes from the given clock; with
+    a SimulatedClock a game steps as fast as the CPU allows.
+    """
+    
+    def __init__(self, clock=None):
+        self.clock = clock if clock is not None else RealClock()
+        self.all_sprites = pygame.sprite.Group()
+        self.bullets = pygame.sprite.Group()
+        self.explosions = Explosions(self.clock, explosion_frames)
+        
+        self.player = Player()
+        self.all_sprites.add(self.player)
+        
+        # Game variables
+        self.score = 0
+        self.game_over = False
+        self.level = 1
+        self.frames = 0
+        
+        # The enemies move as one formation, drawn from its state
+        self.formation = Formation(ENEMY_ROWS, ENEMY_COLS, ENEMY_SPACING, enemy_image.get_width())
+        self.create_enemies()
+    
+    # Create enemies
+    def create_enemies(self):
+        """Fill the enemy formation for a new wave."""
+        # Increase enemy speed with each level
+        self.formation.reset(50, 50, ENEMY_SPEED + self.level - 1)
+    
+    def reset(self):
+        """Start over from the first level."""
+        self.game_over = False
+        self.score = 0
+        self.level = 1
+        self.create_enemies()
+        self.player.rect.centerx = SCREEN_WIDTH // 2
+    
+    def handle_event(self, event):
+        """Apply one input event; returns False if it asks to quit the game."""
         if event.type == QUIT:
-            running = False
+            return False
         elif event.type == KEYDOWN:
             if event.key == K_SPACE:
-                player.shoot()
+                bullet = self.player.shoot()
+                self.all_sprites.add(bullet)
+                self.bullets.add(bullet)
             elif event.key == K_ESCAPE:
-                running = False
-            elif event.key == K_r and game_over:
+                return False
+            elif event.key == K_r and self.game_over:
                 # Reset the game
-                game_over = False
-                score = 0
-                level = 1
-                create_enemies()
-                player.rect.centerx = SCREEN_WIDTH // 2
+                self.reset()
+        return True
     
-    if not game_over:
-        # Update
-        all_sprites.update()
+    def step(self, events, keys):
+        """Advance the game by one frame.
         
-        # Check if any enemy needs to change direction
-        direction_change = False
-        for enemy in enemies:
-            if enemy.update():
-                direction_change = True
-                break
+        events are the input events of the frame and keys the held keys,
+        indexable by key constant like pygame.key.get_pressed(). Nothing is
+        drawn. Returns False if the input asks to quit the game.
+        """
+        self.frames += 1
         
-        # Change direction and move down if needed
-        if direction_change:
-            for enemy in enemies:
-                enemy.speed_x *= -1
-                enemy.rect.y += ENEMY_DROP
+        # Process events
+        running = True
+        for event in events:
+            if not self.handle_event(event):
+                running = False
+        
+        if not self.game_over:
+            self.update(keys)
+        return running
+    
+    def update(self, keys):
+        """Move everything and apply collisions, game over and level-up."""
+        # Update
+        self.player.update(keys)
+        self.bullets.update()
+        self.explosions.update()
+        
+        # Move the formation, changing direction and moving down at an edge
+        self.formation.step(SCREEN_WIDTH, ENEMY_DROP)
         
         # Check for bullet-enemy collisions
-        hits = pygame.sprite.groupcollide(bullets, enemies, True, True)
+        hits = self.collide_bullets()
         for hit in hits:
-            score += 10
+            self.score += 10
             # Create an explosion at the enemy's position
-            explosion = Explosion(hit.rect.center)
-            all_sprites.add(explosion)
-            explosions.add(explosion)
+            self.explosions.add(hit.rect.center)
             # Play explosion sound if available
             if explosion_sound:
                 try:
@@ -282,33 +333,30 @@ while running:
                     pass
         
         # Check if enemies have reached the bottom
-        for enemy in enemies:
-            if enemy.rect.bottom >= SCREEN_HEIGHT:
-                game_over = True
-                # Play game over sound if available
-                if game_over_sound:
-                    try:
-                        game_over_sound.play()
-                    except:
-                        pass
+        bounds = self.formation.bounds()
+        if bounds is not None and bounds[3] >= SCREEN_HEIGHT:
+            self.game_over = True
+            # Play game over sound if available
+            if game_over_sound:
+                try:
+                    game_over_sound.play()
+                except:
+                    pass
         
         # Check if all enemies are destroyed
-        if len(enemies) == 0:
-            level += 1
+        if len(self.formation) == 0:
+            self.level += 1
             # Play level up sound if available
             if level_up_sound:
                 try:
                     level_up_sound.play()
                 except:
                     pass
-            create_enemies()
-            # Increase enemy speed with each level
-            for enemy in enemies:
-                enemy.speed_x = ENEMY_SPEED + (level - 1) * 0.5
+            self.create_enemies()
         
         # Check for enemy-player collisions
-        if pygame.sprite.spritecollide(player, enemies, False):
-            game_over = True
+        if self.formation.colliding(self.player.rect):
+            self.game_over = True
             # Play game over sound if available
             if game_over_sound:
                 try:
@@ -316,35 +364,193 @@ while running:
                 except:
                     pass
     
+    def collide_bullets(self):
+        """Destroy the bullets and enemies that hit each other.
+        
+        Each bullet, in group order, destroys every living enemy it overlaps,
+        found from the formation's position without testing each enemy.
+        Returns the bullets that hit.
+        """
+        hits = []
+        bounds = self.formation.bounds()
+        if bounds is None:
+            return hits
+        
+        # Bullets above or below every enemy can be passed over at once
+        band_top, band_bottom = bounds[1], bounds[3]
+        for bullet in self.bullets.sprites():
+            rect = bullet.rect
+            if rect.bottom <= band_top or rect.top >= band_bottom:
+                continue
+            struck = self.formation.colliding(rect)
+            if struck:
+                for row, col in struck:
+                    self.formation.kill(row, col)
+                bullet.kill()
+                hits.append(bullet)
+        return hits
+    
+    def outcome(self):
+        """Return a summary of the game so far."""
+        return {
+            "frames": self.frames,
+            "score": self.score,
+            "level": self.level,
+            "game_over": self.game_over,
+            "enemies_left": len(self.formation),
+        }
+
+# Fonts and rendered strings for all of the HUD text
+hud_text = TextCache()
+
+# Frame time per stage of the main loop; F3 shows the percentiles
+profiler = FrameProfiler(["update", "render", "display"])
+
+def render(game, surface):
+    """Draw the background, the sprites and the HUD of a game."""
     # Draw / render
-    screen.fill(BLACK)
+    surface.fill(BLACK)
+    
+    # Draw stars, then move them down to create scrolling effect
+    starfield.draw(surface)
+    starfield.update()
     
-    # Draw stars
-    for star in stars:
-        pygame.draw.circle(screen, WHITE, (star[0], star[1]), 1)
-        # Move stars down to create scrolling effect
-        star[1] += star[2]
-        # If the star has moved off the bottom of the screen, reset it to the top
-        if star[1] > SCREEN_HEIGHT:
-            star[1] = 0
-            star[0] = random.randrange(0, SCREEN_WIDTH)
+    draw_scene(game, surface)
+
+def draw_scene(game, surface):
+    """Draw the enemies, sprites, explosions and HUD of a game over the background.
     
-    all_sprites.draw(screen)
+    Returns the rects drawn.
+    """
+    drawn = surface.blits([(enemy_image, position) for position in game.formation.positions()])
+    drawn += [surface.blit(sprite.image, sprite.rect) for sprite in game.all_sprites]
+    drawn += game.explosions.draw(surface)
     
     # Draw score and level
-    score_text = font.render(f"Score: {score}", True, WHITE)
-    level_text = font.render(f"Level: {level}", True, WHITE)
-    screen.blit(score_text, (10, 10))
-    screen.blit(level_text, (10, 50))
+    score_text = hud_text.render(f"Score: {game.score}", WHITE)
+    level_text = hud_text.render(f"Level: {game.level}", WHITE)
+    drawn.append(surface.blit(score_text, (10, 10)))
+    drawn.append(surface.blit(level_text, (10, 50)))
     
     # Draw game over message
-    if game_over:
-        game_over_text = font.render("GAME OVER - Press R to restart", True, WHITE)
-        screen.blit(game_over_text, (SCREEN_WIDTH // 2 - 180, SCREEN_HEIGHT // 2))
+    if game.game_over:
+        game_over_text = hud_text.render("GAME OVER - Press R to restart", WHITE)
+        drawn.append(surface.blit(game_over_text, (SCREEN_WIDTH // 2 - 180, SCREEN_HEIGHT // 2)))
+    
+    if profiler.visible:
+        drawn.append(profiler.draw(surface, hud_text, (SCREEN_WIDTH - 240, 10)))
+    return drawn
+
+class DirtyRenderer:
+    """Draws frames of a game on the display, updating only what changed.
+    
+    An alternative to render() followed by pygame.display.flip(). Instead
+    of clearing the whole screen, each frame paints the background over
+    the rects drawn the frame before, moves the stars pixel by pixel and
+    draws the game again, then passes pygame.display.update() just the
+    rects drawn and erased. When more than max_rects rects changed, as with
+    a large starfield, one full update is cheaper and is used instead.
+    """
+    
+    def __init__(self, surface, max_rects=1000):
+        self.surface = surface
+        self.max_rects = max_rects
+        self.drawn = None  # rects drawn the frame before; None until the first frame
+    
+    def render(self, game):
+        """Draw the next frame of game and update the display."""
+        surface = self.surface
+        if self.drawn is None:
+            surface.fill(BLACK)
+            erased = []
+        else:
+            erased = self.drawn
+            for rect in erased:
+                surface.fill(BLACK, rect)
+        
+        # Move the stars; the rects filled above may have erased some, which come back here
+        stars = starfield.redraw(surface, BLACK)
+        starfield.update()
+        
+        full_update = self.drawn is None
+        self.drawn = draw_scene(game, surface)
+        if full_update or len(erased) + len(self.drawn) + len(stars) > self.max_rects:
+            pygame.display.update()
+        else:
+            width = starfield.width
+            star_rects = [pygame.Rect(pixel % width, pixel // width, 1, 1) for pixel in stars.tolist()]
+            pygame.display.update(erased + self.drawn + star_rects)
+
+def run_headless(inputs, frames):
+    """Play one game per input source side by side, without a window, and return their outcomes.
+    
+    Every game gets its own SimulatedClock, so each outcome depends only on
+    its input, and nothing is drawn. The input sources are polled once per
+    frame; each is a ScriptedInput, a RandomInput or anything with the same
+    poll() method. A game ends at game over, when its input quits, or after
+    the given number of frames.
+    """
+    games = [SpaceInvadersGame(SimulatedClock()) for _ in inputs]
+    playing = list(zip(games, inputs))
+    for frame in range(frames):
+        still_playing = []
+        for game, input_source in playing:
+            game.clock.tick(60)
+            events, keys = input_source.poll()
+            if game.step(events, keys) and not game.game_over:
+                still_playing.append((game, input_source))
+        playing = still_playing
+        if not playing:
+            break
+    return [game.outcome() for game in games]
+
+def main():
+    """Run the game in a window until the player quits."""
+    clock = RealClock()
+    game = SpaceInvadersGame(clock)
+    renderer = DirtyRenderer(screen) if args.dirty else None
+    
+    # Main game loop
+    running = True
+    while running:
+        # Keep the loop running at the right speed
+        clock.tick(60)
+        profiler.begin_frame()
+        
+        # Process input and update the game
+        events = pygame.event.get()
+        for event in events:
+            if event.type == KEYDOWN and event.key == K_F3:
+                profiler.visible = not profiler.visible
+        running = game.step(events, pygame.key.get_pressed())
+        profiler.lap("update")
+        
+        if renderer:
+            renderer.render(game)
+            profiler.lap("render")
+        else:
+            render(game, screen)
+            profiler.lap("render")
+            
+            # Flip the display
+            pygame.display.flip()
+            profiler.lap("display")
+        profiler.end_frame()
+    
+    if args.profile:
+        profiler.dump(args.profile)
     
-    # Flip the display
-    pygame.display.flip()
+    # Quit the game
+    pygame.quit()
+    sys.exit()
 
-# Quit the game
-pygame.quit()
-sys.exit()
+if __name__ == '__main__':
+    if HEADLESS:
+        if args.script:
+            inputs = [ScriptedInput.load(args.script) for _ in range(args.games)]
+        else:
+            inputs = [RandomInput((K_LEFT, K_RIGHT), (K_SPACE,), args.seed + i) for i in range(args.games)]
+        for outcome in run_headless(inputs, args.frames):
+            print(json.dumps(outcome))
+    else:
+        main()
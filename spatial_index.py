@@ -0,0 +1,143 @@
+import math
+
+
+class SpatialHash:
+    """Uniform grid index of entity positions for neighbourhood queries.
+
+    Entities are bucketed by the grid cell their position falls in, so radius
+    and view-cone queries only look at the buckets overlapping the query area
+    instead of every entity. Moving an entity only touches the index when it
+    crosses into a different cell.
+    """
+
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.buckets = {}  # (cell_x, cell_y) -> set of entities
+        self.positions = {}  # entity -> (x, y)
+        self.entity_cells = {}  # entity -> (cell_x, cell_y)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __contains__(self, entity):
+        return entity in self.positions
+
+    def __iter__(self):
+        return iter(self.positions)
+
+    def cell_of(self, x, y):
+        """Return the grid cell containing the point (x, y)."""
+        return int(x // self.cell_size), int(y // self.cell_size)
+
+    def insert(self, entity, x, y):
+        """Add an entity at (x, y)."""
+        cell = self.cell_of(x, y)
+        self.positions[entity] = (x, y)
+        self.entity_cells[entity] = cell
+        self.buckets.setdefault(cell, set()).add(entity)
+
+    def remove(self, entity):
+        """Remove an entity; does nothing if it is not in the index."""
+        cell = self.entity_cells.pop(entity, None)
+        if cell is None:
+            return
+        del self.positions[entity]
+        bucket = self.buckets[cell]
+        bucket.discard(entity)
+        if not bucket:
+            del self.buckets[cell]
+
+    def move(self, entity, x, y):
+        """Update the position of an entity already in the index."""
+        self.positions[entity] = (x, y)
+        cell = self.cell_of(x, y)
+        old_cell = self.entity_cells[entity]
+        if cell != old_cell:
+            self._rebucket(entity, old_cell, cell)
+
+    def move_many(self, entities, xs, ys):
+        """Update the positions of several entities already in the index.
+
+        Does the same as move() for each entity, with the lookups hoisted
+        out of the loop, which matters when a whole crowd moves every tick.
+        xs and ys are sequences of plain floats, e.g. from ndarray.tolist().
+        """
+        positions = self.positions
+        entity_cells = self.entity_cells
+        cell_size = self.cell_size
+        for entity, x, y in zip(entities, xs, ys):
+            positions[entity] = (x, y)
+            cell = (int(x // cell_size), int(y // cell_size))
+            old_cell = entity_cells[entity]
+            if cell != old_cell:
+                self._rebucket(entity, old_cell, cell)
+
+    def clear(self):
+        """Remove every entity."""
+        self.buckets.clear()
+        self.positions.clear()
+        self.entity_cells.clear()
+
+    def query_rect(self, min_x, min_y, max_x, max_y):
+        """Yield the entities whose position lies in the given rectangle."""
+        positions = self.positions
+        for bucket in self._buckets_in(min_x, min_y, max_x, max_y):
+            for entity in bucket:
+                x, y = positions[entity]
+                if min_x <= x <= max_x and min_y <= y <= max_y:
+                    yield entity
+
+    def query_radius(self, x, y, radius):
+        """Return (distance, entity) pairs for entities closer than radius to (x, y)."""
+        results = []
+        positions = self.positions
+        for bucket in self._buckets_in(x - radius, y - radius, x + radius, y + radius):
+            for entity in bucket:
+                entity_x, entity_y = positions[entity]
+                distance = math.hypot(entity_x - x, entity_y - y)
+                if distance < radius:
+                    results.append((distance, entity))
+        return results
+
+    def query_cone(self, x, y, direction, half_angle, max_distance):
+        """Return (distance, angle, entity) for entities inside a view cone.
+
+        The cone starts at (x, y), points along direction and spans
+        half_angle to either side. angle is the entity's bearing relative to
+        direction, normalized to [-pi, pi).
+        """
+        results = []
+        for distance, entity in self.query_radius(x, y, max_distance):
+            entity_x, entity_y = self.positions[entity]
+            angle = (math.atan2(entity_y - y, entity_x - x) - direction + math.pi) % (2 * math.pi) - math.pi
+            if abs(angle) < half_angle:
+                results.append((distance, angle, entity))
+        return results
+
+    def _rebucket(self, entity, old_cell, cell):
+        """Move an entity from the bucket of old_cell to the bucket of cell."""
+        bucket = self.buckets[old_cell]
+        bucket.discard(entity)
+        if not bucket:
+            del self.buckets[old_cell]
+        self.entity_cells[entity] = cell
+        self.buckets.setdefault(cell, set()).add(entity)
+
+    def _buckets_in(self, min_x, min_y, max_x, max_y):
+        """Yield the non-empty buckets overlapping the given rectangle."""
+        min_cell_x, min_cell_y = self.cell_of(min_x, min_y)
+        max_cell_x, max_cell_y = self.cell_of(max_x, max_y)
+        cell_count = (max_cell_x - min_cell_x + 1) * (max_cell_y - min_cell_y + 1)
+
+        # Scan whichever is smaller: the cells under the rectangle or the occupied cells
+        if cell_count > len(self.buckets):
+            for (cell_x, cell_y), bucket in self.buckets.items():
+                if min_cell_x <= cell_x <= max_cell_x and min_cell_y <= cell_y <= max_cell_y:
+                    yield bucket
+        else:
+            buckets = self.buckets
+            for cell_y in range(min_cell_y, max_cell_y + 1):
+                for cell_x in range(min_cell_x, max_cell_x + 1):
+                    bucket = buckets.get((cell_x, cell_y))
+                    if bucket:
+                        yield bucket
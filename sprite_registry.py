@@ -0,0 +1,66 @@
+import math
+
+import pygame
+
+
+class SpriteRegistry:
+    """Shared sprite textures with cached pre-scaled mip levels.
+
+    Each sprite type is drawn once and registered under a key. Scaled copies
+    are made at a fixed set of mip sizes, spaced LEVELS_PER_OCTAVE to a
+    doubling, and kept for reuse, so a renderer asks for the mip nearest to
+    the size it needs instead of scaling the full texture every frame.
+    Darkened copies for distance fog are cached the same way, with the
+    brightness rounded to one of SHADES steps.
+
+    The surfaces handed out are shared and must not be drawn on.
+    """
+
+    LEVELS_PER_OCTAVE = 4
+    SHADES = 16
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.textures = {}
+        self._mips = {}  # (key, mip size, shade) -> Surface
+
+    def register(self, key, texture):
+        """Register the texture for a sprite type, replacing any earlier one."""
+        self.textures[key] = texture
+        for cached in [cached for cached in self._mips if cached[0] == key]:
+            del self._mips[cached]
+
+    def mip_size(self, size):
+        """Return the mip size nearest to size."""
+        if size <= 1:
+            return 1
+        level = round(math.log2(size) * self.LEVELS_PER_OCTAVE)
+        return min(self.max_size, round(2 ** (level / self.LEVELS_PER_OCTAVE)))
+
+    def get(self, key, size, brightness=1.0):
+        """Return the shared texture of a sprite type at the mip nearest to size.
+
+        brightness scales the colour of the texture, from 0.0 (black) to 1.0
+        (unchanged).
+        """
+        mip_size = self.mip_size(size)
+        shade = round(max(0.0, min(1.0, brightness)) * (self.SHADES - 1))
+        cache_key = (key, mip_size, shade)
+        mip = self._mips.get(cache_key)
+        if mip is None:
+            mip = self._build(key, mip_size, shade)
+            self._mips[cache_key] = mip
+        return mip
+
+    def _build(self, key, mip_size, shade):
+        """Scale and shade a texture for one cache entry."""
+        texture = self.textures[key]
+        if shade < self.SHADES - 1:
+            # Start from the unshaded mip of the same size
+            mip = self.get(key, mip_size).copy()
+            value = shade * 255 // (self.SHADES - 1)
+            mip.fill((value, value, value), special_flags=pygame.BLEND_RGB_MULT)
+            return mip
+        if texture.get_size() == (mip_size, mip_size):
+            return texture
+        return pygame.transform.scale(texture, (mip_size, mip_size))
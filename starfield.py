@@ -0,0 +1,89 @@
+import numpy as np
+import pygame
+
+
+class Starfield:
+    """A scrolling field of stars in parallax layers, held in NumPy arrays.
+
+    Each layer is (speed, color): stars in faster layers scroll down more
+    pixels per frame and are drawn in their layer's color, usually brighter,
+    so they seem nearer. A star is stored as the index of its pixel in
+    row-major order, y * width + x, so update() moves every star with one
+    array addition and draw() plots them all as single pixels straight into
+    the target surface's pixel array. The cost per star is a few array
+    elements rather than a draw call.
+    """
+
+    def __init__(self, width, height, count, layers, seed=None):
+        self.width = width
+        self.height = height
+        self.layers = layers
+        self.random = np.random.default_rng(seed)
+
+        # Stars are kept sorted by layer, so each layer is one slice of the arrays
+        layer_sizes = np.bincount(self.random.integers(0, len(layers), count), minlength=len(layers))
+        self.layer_ends = np.cumsum(layer_sizes)
+        # Indices are in NumPy's index type, which indexes the pixel array fastest
+        speeds = np.array([speed for speed, color in layers], dtype=np.intp)
+        self.step = np.repeat(speeds * width, layer_sizes)
+        self.pixel = self.random.integers(0, width * height, count, dtype=np.intp)
+        # Stars as last drawn by redraw(), to be painted over by the next one
+        self.drawn = self.pixel[:0]
+
+    def __len__(self):
+        return len(self.pixel)
+
+    @property
+    def x(self):
+        """Column of every star."""
+        return self.pixel % self.width
+
+    @property
+    def y(self):
+        """Row of every star."""
+        return self.pixel // self.width
+
+    def update(self):
+        """Scroll every star down; stars leaving the bottom come back at the top in a new column."""
+        self.pixel += self.step
+        wrapped = np.flatnonzero(self.pixel >= self.width * self.height)
+        if wrapped.size:
+            row_start = (self.pixel[wrapped] - self.width * self.height) // self.width * self.width
+            # Scaling random floats is several times cheaper than random integers for a few stars
+            self.pixel[wrapped] = row_start + (self.random.random(wrapped.size) * self.width).astype(np.intp)
+
+    def draw(self, surface):
+        """Plot every star as one pixel on the surface."""
+        self._plot(surface, self.pixel, [color for speed, color in self.layers])
+
+    def redraw(self, surface, background):
+        """Move the stars on a surface that is not cleared between frames.
+
+        Paints the background color over the stars drawn by the last call,
+        then draws them where they are now. Returns the pixel indices of
+        both, which are all the pixels that may have changed.
+        """
+        self._plot(surface, self.drawn, [background] * len(self.layers))
+        self._plot(surface, self.pixel, [color for speed, color in self.layers])
+        changed = np.concatenate((self.drawn, self.pixel))
+        self.drawn = self.pixel.copy()
+        return changed
+
+    def _plot(self, surface, stars, colors):
+        """Set the pixels at the given star indices, in the layers' order, to one color per layer."""
+        # Writing through the pixel array locks the surface until it is released
+        pixels = pygame.surfarray.pixels2d(surface)
+        rows = pixels.T
+        if rows.flags.c_contiguous:
+            # The rows are not padded, so the star indices address the pixels directly
+            targets = rows.reshape(-1)
+            positions = [stars]
+        else:
+            targets = pixels
+            positions = [stars % self.width, stars // self.width]
+
+        start = 0
+        for color, end in zip(colors, self.layer_ends):
+            targets[tuple(axis[start:end] for axis in positions)] = surface.map_rgb(color)
+            start = end
+        del pixels, rows, targets
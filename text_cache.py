@@ -0,0 +1,45 @@
+from collections import OrderedDict
+
+import pygame
+
+
+class TextCache:
+    """Rendered HUD text, shared by everything that draws text in a game.
+
+    Fonts are loaded once per (name, size), since every SysFont() call looks
+    the font up on the system again. Rendered strings are kept by their
+    text, color and font, so text that stays the same from frame to frame,
+    like a label or a score that has not changed, is only rendered once. The
+    max_entries most recently used strings are kept, which bounds the memory
+    taken by values that keep changing.
+
+    The surfaces handed out are shared and must not be drawn on.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._fonts = {}  # (name, size) -> Font
+        self._rendered = OrderedDict()  # (text, color, name, size) -> Surface
+
+    def font(self, size=36, name=None):
+        """Return the system font name (the default font if None) at the given size."""
+        key = (name, size)
+        font = self._fonts.get(key)
+        if font is None:
+            font = pygame.font.SysFont(name, size)
+            self._fonts[key] = font
+        return font
+
+    def render(self, text, color, size=36, name=None):
+        """Return text rendered antialiased in color, from the cache if it was rendered before."""
+        key = (text, tuple(color), name, size)
+        surface = self._rendered.get(key)
+        if surface is not None:
+            self._rendered.move_to_end(key)
+            return surface
+
+        surface = self.font(size, name).render(text, True, color)
+        self._rendered[key] = surface
+        if len(self._rendered) > self.max_entries:
+            self._rendered.popitem(last=False)
+        return surface
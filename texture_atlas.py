@@ -0,0 +1,54 @@
+from collections import OrderedDict
+
+import numpy as np
+import pygame
+
+
+class TextureAtlas:
+    """Pre-shaded wall texture columns with a cache of height-scaled copies.
+
+    Every texture is stored once per shading intensity as an array indexed
+    [side, tex_x, tex_y]. Scaled copies are built the first time a wall
+    height is requested and kept in a least-recently-used cache whose total
+    size is bounded by max_cache_bytes, so drawing a wall column becomes an
+    array lookup instead of a scale and a shading blend.
+    """
+
+    def __init__(self, textures, side_intensity=0.7, max_cache_bytes=16 * 1024 * 1024):
+        self.max_cache_bytes = max_cache_bytes
+        self.cache_bytes = 0
+        self._scaled = OrderedDict()
+
+        # Side 0 (x-side) at full intensity, side 1 (y-side) darkened
+        self.columns = []
+        for texture in textures:
+            texture_columns = pygame.surfarray.array3d(texture)
+            self.columns.append(np.stack([
+                texture_columns,
+                (texture_columns * side_intensity).astype(np.uint8)
+            ]))
+
+    def scaled(self, texture_id, wall_height):
+        """Return the texture scaled to wall_height, indexed [side, tex_x, y]."""
+        key = (texture_id, wall_height)
+        scaled = self._scaled.get(key)
+        if scaled is not None:
+            self._scaled.move_to_end(key)
+            return scaled
+
+        # Nearest-neighbour row lookup, matching pygame.transform.scale
+        columns = self.columns[texture_id]
+        tex_ys = np.arange(wall_height) * columns.shape[2] // wall_height
+        scaled = np.ascontiguousarray(columns[:, :, tex_ys])
+
+        self._scaled[key] = scaled
+        self.cache_bytes += scaled.nbytes
+        self._evict()
+        return scaled
+
+    def _evict(self):
+        """Drop the least recently used scaled textures until under budget."""
+        # Always keep the most recent entry, even if it alone exceeds the budget
+        while self.cache_bytes > self.max_cache_bytes and len(self._scaled) > 1:
+            _, scaled = self._scaled.popitem(last=False)
+            self.cache_bytes -= scaled.nbytes
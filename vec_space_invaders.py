@@ -0,0 +1,224 @@
+import numpy as np
+
+from space_invaders import (BULLET_SPEED, ENEMY_COLS, ENEMY_DROP, ENEMY_ROWS, ENEMY_SPACING,
+                            ENEMY_SPEED, PLAYER_SPEED, SCREEN_HEIGHT, SCREEN_WIDTH)
+
+# Sprite sizes, matching the images drawn by the sprite classes in space_invaders.py
+PLAYER_WIDTH, PLAYER_HEIGHT = 50, 40
+ENEMY_SIZE = 40
+BULLET_WIDTH, BULLET_HEIGHT = 5, 15
+
+# The player's top edge never moves; bullets start just above it
+PLAYER_TOP = SCREEN_HEIGHT - 10 - PLAYER_HEIGHT
+
+
+class VecSpaceInvaders:
+    """Many Space Invaders games held as NumPy arrays and stepped together.
+
+    Every game follows the rules of SpaceInvadersGame, with one row per
+    game in each array: the player position, the enemy formation (its
+    position and speed, and one column per formation slot saying whether
+    that enemy is alive), the bullets, the score and the level. step() advances all of the games
+    in a handful of array operations instead of one sprite loop per game,
+    and gives the same positions, scores and levels as the sprite version
+    for the same input.
+
+    A game that is over stays frozen until it is reset.
+    """
+
+    def __init__(self, num_games, bullet_capacity=16):
+        self.num_games = num_games
+        num_enemies = ENEMY_ROWS * ENEMY_COLS
+        self.player_x = np.zeros(num_games, dtype=np.int64)
+        # Top-left corner of each formation's first slot
+        self.formation_x = np.zeros(num_games, dtype=np.int64)
+        self.formation_y = np.zeros(num_games, dtype=np.int64)
+        self.enemy_speed = np.zeros(num_games, dtype=np.int64)
+        # Slot row * ENEMY_COLS + col is alive
+        self.enemy_alive = np.zeros((num_games, num_enemies), dtype=bool)
+        self.bullet_x = np.zeros((num_games, bullet_capacity), dtype=np.int64)
+        self.bullet_y = np.zeros((num_games, bullet_capacity), dtype=np.int64)
+        self.bullet_alive = np.zeros((num_games, bullet_capacity), dtype=bool)
+        # Spawn order of the bullets, which decides which bullet gets an enemy hit by several
+        self.bullet_serial = np.zeros((num_games, bullet_capacity), dtype=np.int64)
+        self.next_serial = 0
+        self.score = np.zeros(num_games, dtype=np.int64)
+        self.level = np.zeros(num_games, dtype=np.int64)
+        self.game_over = np.zeros(num_games, dtype=bool)
+        self.frames = np.zeros(num_games, dtype=np.int64)
+
+        self.reset()
+
+    def reset(self, games=None):
+        """Start the given games over from the first level; all of them if games is None."""
+        if games is None:
+            games = np.ones(self.num_games, dtype=bool)
+        self.player_x[games] = SCREEN_WIDTH // 2 - PLAYER_WIDTH // 2
+        self.bullet_alive[games] = False
+        self.score[games] = 0
+        self.level[games] = 1
+        self.game_over[games] = False
+        self.frames[games] = 0
+        self._new_wave(games)
+
+    def _new_wave(self, games):
+        """Fill the formation of the given games for their current level."""
+        self.formation_x[games] = 50
+        self.formation_y[games] = 50
+        self.enemy_alive[games] = True
+        # Increase enemy speed with each level
+        self.enemy_speed[games] = ENEMY_SPEED + self.level[games] - 1
+
+    def step(self, moves, fire):
+        """Advance every game that is not over by one frame.
+
+        moves holds the direction each player holds: -1 (left arrow), 0 or
+        1 (right arrow). fire is True for the games whose player presses
+        space this frame. Returns (rewards, game_over): the points each game
+        scored in this frame, and which games are now over.
+        """
+        moves = np.asarray(moves)
+        fire = np.asarray(fire, dtype=bool)
+        playing = ~self.game_over
+        score_before = self.score.copy()
+        self.frames[playing] += 1
+
+        # Shoot from the player's position before it moves
+        self._spawn_bullets(playing & fire)
+
+        # Move the players and keep them on the screen
+        speed = np.where(moves > 0, PLAYER_SPEED, np.where(moves < 0, -PLAYER_SPEED, 0))
+        self.player_x = np.where(playing, np.clip(self.player_x + speed, 0, SCREEN_WIDTH - PLAYER_WIDTH),
+                                 self.player_x)
+
+        self._move_enemies(playing)
+
+        # Move the bullets and drop those that left the top of the screen
+        bullets = self.bullet_alive & playing[:, None]
+        self.bullet_y[bullets] -= BULLET_SPEED
+        self.bullet_alive &= self.bullet_y + BULLET_HEIGHT >= 0
+
+        self._collide_bullets(playing)
+
+        # Game over once an enemy reaches the bottom
+        self.game_over |= playing & (self._lowest_enemy() >= SCREEN_HEIGHT)
+
+        # Start a faster wave once every enemy is destroyed
+        cleared = playing & ~self.enemy_alive.any(axis=1)
+        if cleared.any():
+            self.level[cleared] += 1
+            self._new_wave(cleared)
+
+        # Game over when an enemy touches the player
+        games = np.arange(self.num_games)
+        touching, _ = self._touching(games, self.player_x, np.full(self.num_games, PLAYER_TOP),
+                                     PLAYER_WIDTH, PLAYER_HEIGHT)
+        self.game_over[touching[playing[touching]]] = True
+
+        return self.score - score_before, self.game_over.copy()
+
+    def _spawn_bullets(self, shooting):
+        """Add a bullet above the player of every shooting game."""
+        games = np.flatnonzero(shooting)
+        if games.size == 0:
+            return
+        free = ~self.bullet_alive[games]
+        if not free.any(axis=1).all():
+            self._grow_bullets()
+            free = ~self.bullet_alive[games]
+
+        slots = free.argmax(axis=1)
+        self.bullet_x[games, slots] = self.player_x[games] + PLAYER_WIDTH // 2 - BULLET_WIDTH // 2
+        self.bullet_y[games, slots] = PLAYER_TOP - BULLET_HEIGHT
+        self.bullet_alive[games, slots] = True
+        self.bullet_serial[games, slots] = self.next_serial + np.arange(games.size)
+        self.next_serial += games.size
+
+    def _grow_bullets(self):
+        """Double the bullet capacity of every game."""
+        for name in ("bullet_x", "bullet_y", "bullet_alive", "bullet_serial"):
+            column = getattr(self, name)
+            setattr(self, name, np.concatenate([column, np.zeros_like(column)], axis=1))
+
+    def _lowest_enemy(self):
+        """Return the bottom edge of each game's lowest living enemy, or -inf if none are left."""
+        alive_rows = self.enemy_alive.reshape(self.num_games, ENEMY_ROWS, ENEMY_COLS).any(axis=2)
+        last_row = ENEMY_ROWS - 1 - alive_rows[:, ::-1].argmax(axis=1)
+        return np.where(alive_rows.any(axis=1),
+                        self.formation_y + last_row * ENEMY_SPACING + ENEMY_SIZE, -np.inf)
+
+    def _move_enemies(self, playing):
+        """Move the formations sideways, and turn and drop those that reach an edge.
+
+        Only the outermost living columns of a formation can reach an edge.
+        """
+        self.formation_x[playing] += self.enemy_speed[playing]
+        alive_cols = self.enemy_alive.reshape(self.num_games, ENEMY_ROWS, ENEMY_COLS).any(axis=1)
+        first_col = alive_cols.argmax(axis=1)
+        last_col = ENEMY_COLS - 1 - alive_cols[:, ::-1].argmax(axis=1)
+        left = self.formation_x + first_col * ENEMY_SPACING
+        right = self.formation_x + last_col * ENEMY_SPACING + ENEMY_SIZE
+        turning = playing & alive_cols.any(axis=1) & ((right > SCREEN_WIDTH) | (left < 0))
+
+        # Change direction and move down
+        self.enemy_speed[turning] *= -1
+        self.formation_y[turning] += ENEMY_DROP
+
+    def _touching(self, games, x, y, width, height):
+        """Find the living enemies overlapping rects of one size.
+
+        Rect i has its top-left corner at (x[i], y[i]) and is tested against
+        the formation of game games[i]. Since the enemies sit in a rigid
+        grid, the few rows and columns a rect can overlap follow from the
+        formation's position alone. Returns (rects, slots): the index of the
+        rect and the formation slot of the enemy of every overlapping pair.
+        """
+        max_rows = -(-(height + ENEMY_SIZE) // ENEMY_SPACING)
+        max_cols = -(-(width + ENEMY_SIZE) // ENEMY_SPACING)
+        formation_x = self.formation_x[games]
+        formation_y = self.formation_y[games]
+        first_row = (y - formation_y - ENEMY_SIZE) // ENEMY_SPACING + 1
+        first_col = (x - formation_x - ENEMY_SIZE) // ENEMY_SPACING + 1
+        rows = (first_row[:, None] + np.arange(max_rows)).repeat(max_cols, axis=1)
+        cols = np.tile(first_col[:, None] + np.arange(max_cols), max_rows)
+        in_grid = (rows >= 0) & (rows < ENEMY_ROWS) & (cols >= 0) & (cols < ENEMY_COLS)
+        slots = np.where(in_grid, rows * ENEMY_COLS + cols, 0)
+
+        # Each candidate slot must hold a living enemy that overlaps the rect
+        enemy_x = formation_x[:, None] + cols * ENEMY_SPACING
+        enemy_y = formation_y[:, None] + rows * ENEMY_SPACING
+        touching = (in_grid & self.enemy_alive[games[:, None], slots] &
+                    (x[:, None] < enemy_x + ENEMY_SIZE) & (x[:, None] + width > enemy_x) &
+                    (y[:, None] < enemy_y + ENEMY_SIZE) & (y[:, None] + height > enemy_y))
+        rects, candidates = np.nonzero(touching)
+        return rects, slots[rects, candidates]
+
+    def _collide_bullets(self, playing):
+        """Remove the bullets and enemies that hit each other and score the hits.
+
+        Each enemy is destroyed by the earliest bullet touching it, and
+        every bullet that destroyed at least one enemy scores 10 points, as
+        in SpaceInvadersGame.collide_bullets.
+        """
+        # Only bullets level with a game's lowest enemy or above it can hit anything
+        games, slots = np.nonzero(self.bullet_alive & playing[:, None] &
+                                  (self.bullet_y < self._lowest_enemy()[:, None]))
+        if games.size == 0:
+            return
+        bullets, enemies = self._touching(games, self.bullet_x[games, slots], self.bullet_y[games, slots],
+                                          BULLET_WIDTH, BULLET_HEIGHT)
+        if bullets.size == 0:
+            return
+
+        # The earliest bullet touching each enemy destroys it
+        hit_games = games[bullets]
+        order = np.lexsort((self.bullet_serial[hit_games, slots[bullets]], enemies, hit_games))
+        pair_games, pair_enemies, pair_bullets = hit_games[order], enemies[order], bullets[order]
+        first = np.ones(order.size, dtype=bool)
+        first[1:] = (pair_games[1:] != pair_games[:-1]) | (pair_enemies[1:] != pair_enemies[:-1])
+        self.enemy_alive[pair_games[first], pair_enemies[first]] = False
+
+        # Remove and score every bullet that destroyed an enemy
+        scoring = np.unique(pair_bullets[first])
+        self.bullet_alive[games[scoring], slots[scoring]] = False
+        np.add.at(self.score, games[scoring], 10)
@@ -0,0 +1,50 @@
+import numpy as np
+import pygame
+
+
+class WallRenderer:
+    """Draws textured, shaded wall strips straight into one frame buffer.
+
+    The frame is built as a (width, height, 3) array and copied to the target
+    surface with a single surfarray blit, so no per-column Surfaces are
+    created. Columns sharing a wall height share one scaled texture from the
+    TextureAtlas, which keeps the per-frame Python work bounded by the number
+    of distinct wall heights rather than the number of columns.
+    """
+
+    def __init__(self, width, height, atlas, ceiling_color, floor_color):
+        self.width = width
+        self.height = height
+        self.atlas = atlas
+
+        # Background column: ceiling on the top half, floor on the bottom half
+        self.background = np.empty((height, 3), dtype=np.uint8)
+        self.background[:height // 2] = ceiling_color
+        self.background[height // 2:] = floor_color
+
+        self.frame = np.empty((width, height, 3), dtype=np.uint8)
+
+    def wall_heights(self, distances, cell_size):
+        """Return the on-screen height of the wall strip for each column."""
+        with np.errstate(divide='ignore'):
+            heights = (self.height / distances * cell_size / 2).astype(np.int64)
+        return np.where(distances > 0, np.minimum(heights, self.height), self.height)
+
+    def render(self, target, distances, tex_xs, sides, cell_size, texture_id):
+        """Draw the ceiling, floor and wall columns for one frame onto target."""
+        frame = self.frame
+        frame[:] = self.background
+
+        heights = self.wall_heights(distances, cell_size)
+        tex_xs = tex_xs.astype(np.int64)
+
+        # Draw every column of the same height from one cached scaled texture
+        for wall_height in np.unique(heights):
+            if wall_height <= 0:
+                continue
+            selected = np.nonzero(heights == wall_height)[0]
+            wall_top = (self.height - wall_height) // 2
+            scaled = self.atlas.scaled(texture_id, int(wall_height))
+            frame[selected, wall_top:wall_top + wall_height] = scaled[sides[selected], tex_xs[selected]]
+
+        pygame.surfarray.blit_array(target, frame)